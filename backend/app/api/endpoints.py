@@ -1,17 +1,22 @@
-from fastapi import APIRouter, HTTPException, Depends, Header, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, Header, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse, JSONResponse
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Literal, Tuple
+import asyncio
 import logging
-import pandas as pd
-import os
+import numpy as np
 import json
+import re
 
 from app.core.config import settings
-from app.core.ingestion import ingestion_manager
 from app.core.retrieval import retriever
 from app.core.generation import get_rag_engine
 from app.core.cache import get_cache
+from app.core.executor import get_retrieval_executor, RetrievalSaturatedError
+from app.core.jobs import get_job_manager
+from app.core.loader import source_context
+from app.core.metrics import RequestTimer, observe_stage, time_stage
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -27,127 +32,409 @@ async def verify_api_key(x_api_key: str = Header(...)):
 class QueryRequest(BaseModel):
     query: str
     top_k: int = 8
-    max_tokens: int = 1024
+    max_tokens: int = Field(default=1024, gt=0, le=settings.MAX_ANSWER_TOKENS)
     stream: bool = False
+    # Hybrid fusion overrides; default to the configured FUSION_STRATEGY / HYBRID_ALPHA
+    fusion: Optional[Literal["weighted", "minmax", "zscore", "rrf"]] = None
+    alpha: Optional[float] = Field(default=None, ge=0.0, le=1.0)
 
-class IngestResponse(BaseModel):
+class BatchQueryRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=settings.BATCH_QUERY_MAX)
+    top_k: int = 8
+    max_tokens: int = Field(default=1024, gt=0, le=settings.MAX_ANSWER_TOKENS)
+    # Sources only, no LLM call (e.g. for recall evaluation)
+    retrieval_only: bool = False
+    fusion: Optional[Literal["weighted", "minmax", "zscore", "rrf"]] = None
+    alpha: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+
+class IngestJobResponse(BaseModel):
+    job_id: str
+    kind: str
     status: str
-    total_chunks: int
-
-@router.post("/ingest", response_model=IngestResponse)
-async def ingest_data(background_tasks: BackgroundTasks, api_key: str = Depends(verify_api_key)):
-    # Trigger ingestion in background? Or sync?
-    # User said "Returns ingestion status, total chunks added."
-    # If file is huge, sync might timeout. But for 26k lines it's fine.
-    # Let's do sync for now to return accurate count.
-    try:
-        count = ingestion_manager.run_ingestion()
-        # Reload retriever
-        retriever.load_index()
-        return {"status": "success", "total_chunks": count}
-    except Exception as e:
-        logger.error(f"Ingestion failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/reindex")
+@router.post("/ingest", response_model=IngestJobResponse, status_code=202)
+async def ingest_data(api_key: str = Depends(verify_api_key)):
+    """Start an incremental ingestion job. Poll /ingest/{job_id} for progress."""
+    job = get_job_manager().submit(full_rebuild=False)
+    return job.to_dict()
+
+@router.post("/reindex", response_model=IngestJobResponse, status_code=202)
 async def reindex(api_key: str = Depends(verify_api_key)):
-    try:
-        # Delete existing index
-        if os.path.exists(ingestion_manager.index_path):
-            import shutil
-            shutil.rmtree(ingestion_manager.index_path)
-        count = ingestion_manager.run_ingestion()
-        retriever.load_index()
-        return {"status": "reindexed", "total_chunks": count}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    """Start a full rebuild job; the current index keeps serving until it finishes."""
+    job = get_job_manager().submit(full_rebuild=True)
+    return job.to_dict()
+
+@router.get("/ingest/{job_id}")
+async def ingest_status(job_id: str, api_key: str = Depends(verify_api_key)):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@router.post("/ingest/{job_id}/cancel")
+async def cancel_ingest(job_id: str, api_key: str = Depends(verify_api_key)):
+    job = get_job_manager().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+def _retrieval_params(request) -> str:
+    """Fusion settings that shape the retrieved context, part of every cache key."""
+    fusion = request.fusion or settings.FUSION_STRATEGY
+    alpha = request.alpha if request.alpha is not None else settings.HYBRID_ALPHA
+    return f"{fusion}:{alpha}"
+
+def _sources(docs) -> List[dict]:
+    return [{"chunk_id": d.metadata.get("chunk_id"), "snippet": d.metadata.get("original_text_snippet"), "score": d.metadata.get("score")} for d in docs]
+
+async def _replay(response: dict):
+    """Stream a cached answer in the same NDJSON events as a live generation."""
+    yield json.dumps({"type": "sources", "data": response["sources"]}) + "\n"
+    for token in re.findall(r"\s*\S+|\s+$", response["answer"]):
+        yield json.dumps({"type": "token", "data": token}) + "\n"
+
+# Executor timings (ms) -> stage names in rag_stage_seconds and Server-Timing
+_RETRIEVAL_STAGES = {
+    "queue_wait_ms": "queue_wait",
+    "dense_ms": "dense",
+    "lexical_ms": "lexical",
+    "fusion_ms": "fusion",
+    "total_ms": "retrieval",
+}
+
+def _timing_headers(timer: RequestTimer) -> Dict[str, str]:
+    return {"Server-Timing": timer.header()} if settings.SERVER_TIMING else {}
+
+async def _answer(query: str, docs, top_k: int, max_tokens: int, answer_params: str, index_version: Optional[int], query_vector) -> dict:
+    """Generate and cache a non-streamed answer. Identical concurrent questions wait for a single generation."""
+    cache = get_cache()
+    chunk_ids = [d.metadata.get("chunk_id") for d in docs]
+
+    async def generate():
+        answer = await get_rag_engine().generate(query, docs, stream=False, max_tokens=max_tokens)
+        sources = _sources(docs)
+        
+        # Cache the response
+        vector = query_vector if query_vector is not None else await cache.get_embedding(query)
+        await cache.set_answer(query, chunk_ids, answer, sources, top_k, answer_params, index_version, vector)
+        
+        return {
+            "answer": answer,
+            "sources": sources,
+            "cached": False
+        }
+
+    key = cache.answer_key(query, chunk_ids, answer_params, index_version)
+    return await cache.single_flight(key, generate)
+
+def _cached_response(request: QueryRequest, response: dict, timer: RequestTimer, result: str):
+    timer.finish("stream" if request.stream else "json", result)
+    if request.stream:
+        return StreamingResponse(_replay(response), media_type="application/x-ndjson", headers=_timing_headers(timer))
+    return JSONResponse(response, headers=_timing_headers(timer))
 
 @router.post("/query")
 async def query_endpoint(request: QueryRequest):
-    # 1. Retrieve
-    docs = retriever.search(request.query, top_k=request.top_k)
+    timer = RequestTimer()
+    snapshot = retriever.snapshot
+    index_version = snapshot.version if snapshot else None
+    cache = get_cache()
+    params = _retrieval_params(request)
+    # Answers also depend on the output limit
+    answer_params = f"{params}:{request.max_tokens}"
+    
+    # 1. Retrieve, through the cache layers: an identical earlier search skips
+    # embedding, FAISS and BM25, and a cached query embedding skips the model
+    query_vector = None
+    with time_stage("retrieval_cache"):
+        hits = await cache.get_retrieval(request.query, request.top_k, params, index_version)
+    if hits is not None:
+        docs = retriever.get_documents(hits)
+        logger.info(f"Retrieval cache hit for '{request.query[:50]}'")
+    else:
+        async def find_similar():
+            # Paraphrases of an already answered question reuse its answer
+            if not cache.semantic_enabled:
+                return None
+            with time_stage("semantic_cache"):
+                return await cache.find_similar(query_vector, request.top_k, answer_params, index_version)
+
+        with time_stage("embedding_cache"):
+            query_vector = await cache.get_embedding(request.query)
+        embedded = query_vector is None
+        if not embedded:
+            similar = await find_similar()
+            if similar:
+                return _cached_response(request, similar, timer, "semantic_cache")
+        
+        # On the retrieval pool, so the event loop keeps serving streams. Without a
+        # cached vector the pool embeds the query too, batched with concurrent searches.
+        try:
+            docs, timings, query_vector = await get_retrieval_executor().search(
+                request.query, top_k=request.top_k, alpha=request.alpha, fusion=request.fusion, query_vector=query_vector
+            )
+        except RetrievalSaturatedError as e:
+            logger.warning(f"Retrieval saturated, rejecting query: {e}")
+            raise HTTPException(status_code=503, detail="Retrieval is saturated, please retry", headers={"Retry-After": "1"})
+        logger.info(f"Retrieval timings (ms) for '{request.query[:50]}': " + ", ".join(f"{k}={v:.1f}" for k, v in timings.items()))
+        # Recorded here rather than in the retriever, which may run in a worker process
+        for name, stage in _RETRIEVAL_STAGES.items():
+            if name in timings:
+                observe_stage(stage, timings[name] / 1000)
+        if embedded and query_vector is not None:
+            observe_stage("embed", timings.get("embed_ms", 0.0) / 1000)
+            await cache.set_embedding(request.query, query_vector)
+            # Checked after the search here, which a paraphrase hit still saves generation for
+            similar = await find_similar()
+            if similar:
+                return _cached_response(request, similar, timer, "semantic_cache")
+        await cache.set_retrieval(
+            request.query, request.top_k, params, index_version,
+            [(d.metadata.get("chunk_id"), d.metadata.get("score")) for d in docs],
+        )
+    
+    chunk_ids = [d.metadata.get("chunk_id") for d in docs]
+    with time_stage("answer_cache"):
+        cached_response = await cache.get_answer(request.query, chunk_ids, answer_params, index_version)
+    if cached_response:
+        logger.info(f"Returning cached response for: {request.query[:50]}...")
+        return _cached_response(request, cached_response, timer, "answer_cache")
+    
+    async def store_answer(answer: str, sources: list):
+        vector = query_vector if query_vector is not None else await cache.get_embedding(request.query)
+        await cache.set_answer(request.query, chunk_ids, answer, sources, request.top_k, answer_params, index_version, vector)
     
     # 2. Generate
     if request.stream:
         async def event_generator():
+            result = "generated"
             try:
-                # Send sources first? Or after?
-                # Usually SSE sends chunks. We can send a special event for sources.
-                # But standard SSE is just text.
-                # We can send JSON chunks.
-                
-                # Send sources first
-                sources = [{"chunk_id": d.metadata.get("chunk_id"), "snippet": d.metadata.get("original_text_snippet"), "score": d.metadata.get("score")} for d in docs]
+                # Send sources first, then the answer as it is generated
+                sources = _sources(docs)
                 yield json.dumps({"type": "sources", "data": sources}) + "\n"
                 
-                generator = await get_rag_engine().generate(request.query, docs, stream=True)
+                tokens = []
+                generator = await get_rag_engine().generate(request.query, docs, stream=True, max_tokens=request.max_tokens)
                 async for token in generator:
+                    tokens.append(token)
                     yield json.dumps({"type": "token", "data": token}) + "\n"
+                # Only complete answers are cached, so later requests can replay them
+                await store_answer("".join(tokens), sources)
             except Exception as e:
                 # Fallback
+                result = "fallback"
                 logger.error(f"Streaming generation failed: {e}")
                 fallback_docs = [{"content": d.page_content, "metadata": d.metadata} for d in docs[:3]]
                 yield json.dumps({"type": "error", "data": "Generation failed", "fallback": fallback_docs}) + "\n"
+            timer.finish("stream", result)
 
-        return StreamingResponse(event_generator(), media_type="application/x-ndjson")
+        # Headers go out before generation, so they only cover the stages up to here
+        return StreamingResponse(event_generator(), media_type="application/x-ndjson", headers=_timing_headers(timer))
     else:
-        # Check cache first (only for non-streaming)
-        cache = get_cache()
-        cached_response = cache.get(request.query, request.top_k)
-        if cached_response:
-            logger.info(f"Returning cached response for: {request.query[:50]}...")
-            return cached_response
-        
         try:
-            answer = await get_rag_engine().generate(request.query, docs, stream=False)
-            sources = [{"chunk_id": d.metadata.get("chunk_id"), "snippet": d.metadata.get("original_text_snippet"), "score": d.metadata.get("score")} for d in docs]
-            
-            # Cache the response
-            cache.set(request.query, request.top_k, answer, sources)
-            
-            return {
-                "answer": answer,
-                "sources": sources,
-                "cached": False
-            }
+            response = await _answer(
+                request.query, docs, request.top_k, request.max_tokens, answer_params, index_version, query_vector
+            )
+            timer.finish("json", "generated")
         except Exception as e:
             logger.error(f"Generation failed: {e}")
-            return {
+            response = {
                 "error": "Generation failed",
                 "fallback_docs": [{"content": d.page_content, "metadata": d.metadata} for d in docs[:3]]
             }
+            timer.finish("json", "fallback")
+        return JSONResponse(response, headers=_timing_headers(timer))
+
+# Caps batch generations across all batch requests of this worker
+_batch_generation_slots: Optional[asyncio.Semaphore] = None
+
+def _generation_slots() -> asyncio.Semaphore:
+    global _batch_generation_slots
+    if _batch_generation_slots is None:
+        _batch_generation_slots = asyncio.Semaphore(max(1, settings.BATCH_GENERATION_CONCURRENCY))
+    return _batch_generation_slots
+
+async def _search_batch(request: BatchQueryRequest, queries: List[str]) -> Tuple[list, Optional[np.ndarray]]:
+    """Retrieve for a slice of a batch on the retrieval pool: one embedding pass for the uncached queries, one batched search.
+
+    Bulk work waits for interactive queries rather than failing at once, but only for
+    BATCH_SATURATED_WAIT seconds; then RetrievalSaturatedError propagates.
+    """
+    cache = get_cache()
+    vectors = list(await asyncio.gather(*(cache.get_embedding(q) for q in queries)))
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.BATCH_SATURATED_WAIT
+    while True:
+        try:
+            results, timings, matrix = await get_retrieval_executor().search_batch(
+                queries, top_k=request.top_k, alpha=request.alpha, fusion=request.fusion, query_vectors=vectors
+            )
+            break
+        except RetrievalSaturatedError:
+            if loop.time() >= deadline:
+                raise
+            await asyncio.sleep(0.1)
+    if matrix is not None:
+        await asyncio.gather(*(cache.set_embedding(queries[i], matrix[i]) for i in missing))
+    logger.info(f"Batch retrieval timings (ms) for {len(queries)} queries: " + ", ".join(f"{k}={v:.1f}" for k, v in timings.items()))
+    return results, matrix
+
+@router.post("/query/batch")
+async def query_batch_endpoint(request: BatchQueryRequest):
+    """Many queries in one request, streamed back as NDJSON lines in completion order.
+
+    Queries are embedded and searched BATCH_QUERY_SIZE at a time, and answers are
+    generated BATCH_GENERATION_CONCURRENCY at a time (through the answer cache).
+    Each line is a "result" or "error" event carrying the query's `index`; a final
+    "done" event closes the stream. Returns 503 if the retrieval pool stays saturated
+    before anything is streamed; later, the remaining queries fail as "error" lines.
+    """
+    timer = RequestTimer()
+    snapshot = retriever.snapshot
+    index_version = snapshot.version if snapshot else None
+    cache = get_cache()
+    answer_params = f"{_retrieval_params(request)}:{request.max_tokens}"
+
+    # The first slice is retrieved before responding, so overload can still be answered with a 503
+    prefetched = {}
+    try:
+        prefetched[0] = await _search_batch(request, request.queries[:settings.BATCH_QUERY_SIZE])
+    except RetrievalSaturatedError as e:
+        logger.warning(f"Retrieval saturated, rejecting batch of {len(request.queries)} queries: {e}")
+        raise HTTPException(status_code=503, detail="Retrieval is saturated, please retry", headers={"Retry-After": "1"})
+    except Exception as e:
+        # Retried, and reported per query if it fails again, by the stream below
+        logger.error(f"Batch retrieval failed: {e}")
+
+    async def answer_one(index: int, query: str, docs, query_vector) -> dict:
+        if request.retrieval_only:
+            return {"type": "result", "index": index, "query": query, "sources": _sources(docs)}
+        try:
+            chunk_ids = [d.metadata.get("chunk_id") for d in docs]
+            response = await cache.get_answer(query, chunk_ids, answer_params, index_version)
+            if not response:
+                async with _generation_slots():
+                    response = await _answer(query, docs, request.top_k, request.max_tokens, answer_params, index_version, query_vector)
+            return {"type": "result", "index": index, "query": query, **response}
+        except Exception as e:
+            logger.error(f"Batch generation failed for '{query[:50]}': {e}")
+            fallback_docs = [{"content": d.page_content, "metadata": d.metadata} for d in docs[:3]]
+            return {"type": "error", "index": index, "query": query, "data": "Generation failed", "fallback": fallback_docs}
+
+    async def events():
+        done: asyncio.Queue = asyncio.Queue()
+        # Bounds the retrieved-but-unanswered queries held in memory
+        in_flight = asyncio.Semaphore(settings.BATCH_QUERY_SIZE * 2)
+        tasks = set()
+
+        async def finish(index: int, query: str, docs, query_vector):
+            try:
+                done.put_nowait(await answer_one(index, query, docs, query_vector))
+            finally:
+                in_flight.release()
+
+        async def produce():
+            try:
+                for start in range(0, len(request.queries), settings.BATCH_QUERY_SIZE):
+                    queries = request.queries[start:start + settings.BATCH_QUERY_SIZE]
+                    try:
+                        results, vectors = prefetched.pop(start, None) or await _search_batch(request, queries)
+                    except RetrievalSaturatedError as e:
+                        # Still saturated after waiting: shed the rest of the batch instead of holding on to it
+                        logger.warning(f"Retrieval saturated, failing the last {len(request.queries) - start} batch queries: {e}")
+                        for i, query in enumerate(request.queries[start:], start):
+                            done.put_nowait({"type": "error", "index": i, "query": query, "data": "Retrieval is saturated"})
+                        break
+                    except Exception as e:
+                        logger.error(f"Batch retrieval failed: {e}")
+                        for i, query in enumerate(queries):
+                            done.put_nowait({"type": "error", "index": start + i, "query": query, "data": "Retrieval failed"})
+                        continue
+                    for i, (query, docs) in enumerate(zip(queries, results)):
+                        await in_flight.acquire()
+                        vector = vectors[i] if vectors is not None else None
+                        task = asyncio.create_task(finish(start + i, query, docs, vector))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                await asyncio.gather(*list(tasks))
+            finally:
+                done.put_nowait(None)
+
+        producer = asyncio.create_task(produce())
+        counts = {"result": 0, "error": 0}
+        try:
+            while (event := await done.get()) is not None:
+                counts[event["type"]] += 1
+                yield json.dumps(event) + "\n"
+            await producer
+            timer.finish("batch", "retrieval_only" if request.retrieval_only else "generated")
+            yield json.dumps({
+                "type": "done",
+                "queries": len(request.queries),
+                "errors": counts["error"],
+                "elapsed_ms": timer.stages["total"],
+            }) + "\n"
+        finally:
+            # Client went away (or we failed): stop retrieving and generating for it
+            producer.cancel()
+            for task in list(tasks):
+                task.cancel()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
 
 @router.get("/health")
 async def health_check():
-    index_exists = os.path.exists(settings.INDEX_FILE) or os.path.exists(os.path.join(settings.DATA_DIR, "faiss_index"))
-    return {"status": "ok", "index_present": index_exists}
+    snapshot = retriever.snapshot
+    return {
+        "status": "ok",
+        "index_present": snapshot is not None or retriever.versions.current_path() is not None,
+        "index_version": snapshot.version if snapshot else None,
+    }
+
+class MetadataBatchRequest(BaseModel):
+    chunk_ids: List[str] = Field(..., max_length=1000)
 
 @router.get("/metadata/{chunk_id}")
 async def get_metadata(chunk_id: str):
-    # Read from JSONL
-    # This is inefficient for random access. 
-    # Better to load into a dict or use a proper DB.
-    # For this assignment, we'll scan the file or cache it.
-    # Since we loaded it in retrieval for BM25 (maybe), we could use that.
-    # Or just scan the file.
-    
-    meta_path = os.path.join(settings.DATA_DIR, settings.METADATA_FILE)
-    if not os.path.exists(meta_path):
-        raise HTTPException(status_code=404, detail="Metadata not found")
-        
-    # Simple scan (slow but works for file based)
-    with open(meta_path, 'r') as f:
-        for line in f:
-            record = json.loads(line)
-            if record.get("chunk_id") == chunk_id:
-                return record
-    
-    raise HTTPException(status_code=404, detail="Chunk not found")
+    # Binary search in the live index version's chunk store, off the event loop
+    found = await run_in_threadpool(retriever.get_metadata, [chunk_id])
+    if chunk_id not in found:
+        raise HTTPException(status_code=404, detail="Chunk not found")
+    return found[chunk_id]
+
+@router.post("/metadata/batch")
+async def get_metadata_batch(request: MetadataBatchRequest):
+    found = await run_in_threadpool(retriever.get_metadata, request.chunk_ids)
+    return {
+        "found": found,
+        "missing": [chunk_id for chunk_id in request.chunk_ids if chunk_id not in found],
+    }
+
+@router.get("/source/{chunk_id}")
+async def get_source(chunk_id: str, context: int = Query(0, ge=0, le=20000)):
+    """The chunk where it sits in its source file, with up to `context` bytes either side."""
+    docs = await run_in_threadpool(retriever.get_documents, [(chunk_id, None)])
+    if not docs:
+        raise HTTPException(status_code=404, detail="Chunk not found")
+    metadata = docs[0].metadata
+    start, end = metadata.get("start_pos", -1), metadata.get("end_pos", -1)
+    if start < 0:
+        raise HTTPException(status_code=404, detail="No source offsets for this chunk; reindex to record them")
+    # Sliced from a shared mmap of the file rather than any stored copy
+    found = await run_in_threadpool(source_context, metadata["source_file"], start, end, context)
+    if found is None or found["text"] != docs[0].page_content:
+        raise HTTPException(status_code=409, detail="Source file changed since it was indexed")
+    return {"chunk_id": chunk_id, "source_file": metadata["source_file"], "start_pos": start, "end_pos": end, **found}
 
 @router.post("/cache/clear")
 async def clear_cache(api_key: str = Depends(verify_api_key)):
-    """Clear all cached query responses (admin only)."""
-    cache = get_cache()
-    cleared = cache.clear()
-    return {"status": "success", "cleared_entries": cleared}
+    """Invalidate all cached responses (admin only) by moving to a new cache generation."""
+    generation = await get_cache().clear()
+    return {"status": "success", "generation": generation}
+
+@router.get("/cache/stats")
+async def cache_stats(api_key: str = Depends(verify_api_key)):
+    """Hit rates per cache layer and Redis entries/bytes per namespace (admin only)."""
+    return await get_cache().stats()
 
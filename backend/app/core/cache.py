@@ -1,15 +1,221 @@
+import asyncio
+import base64
 import hashlib
 import json
 import logging
-from typing import Optional, Dict, Any
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, AsyncIterator, Awaitable, Callable, List, Sequence, Tuple
+import faiss
+import numpy as np
 import redis
+import redis.asyncio as aioredis
 from app.core.config import settings
+from app.core.metrics import CACHE_LOOKUPS
 
 logger = logging.getLogger(__name__)
 
 
+GENERATION_KEY = "rag:generation"
+# Layers whose keys carry the index version after the generation
+_VERSIONED_KINDS = ("retrieval", "answer", "semantic")
+
+
+def _namespace(generation: int, index_version: Optional[int]) -> str:
+    # Rankings and answers are only valid for the index they were built from
+    return f"g{generation}:v{index_version if index_version is not None else 0}"
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.md5("\n".join(parts).encode()).hexdigest()
+
+
+def _encode_vector(vector: np.ndarray) -> str:
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def _decode_vector(value: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(value), dtype=np.float32)
+
+
+class SemanticIndex:
+    """Query embeddings of cached answers for one index version.
+
+    A flat inner-product FAISS index over L2-normalized vectors, so a search
+    returns cosine similarities. Entries are appended to a Redis list; when a
+    lookup misses locally, a worker reads the part of the list it has not seen
+    yet. Holds at most `max_entries`.
+    """
+
+    def __init__(self, namespace: str, max_entries: int):
+        self.namespace = namespace
+        self.redis_key = f"rag:semantic:{namespace}"
+        self.max_entries = max_entries
+        self.index: Optional[faiss.IndexFlatIP] = None
+        self.keys: List[str] = []  # Answer cache key of each FAISS row
+        self.params: List[str] = []
+        self._known = set()  # Keys added or skipped, so syncs only decode new ones
+        self.offset = 0  # Entries of the Redis list read so far
+        self.synced_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def full(self) -> bool:
+        return len(self) >= self.max_entries
+
+    @staticmethod
+    def normalize(vector: Sequence[float]) -> np.ndarray:
+        matrix = np.asarray(vector, dtype=np.float32).reshape(1, -1).copy()
+        faiss.normalize_L2(matrix)
+        return matrix
+
+    def add(self, key: str, params: str, vector: np.ndarray):
+        if key in self._known:
+            return
+        self._known.add(key)
+        if self.full:
+            return
+        if self.index is None:
+            self.index = faiss.IndexFlatIP(vector.shape[1])
+        elif vector.shape[1] != self.index.d:
+            # Embedding model changed under the same index version; ignore stale entries
+            return
+        self.index.add(vector)
+        self.keys.append(key)
+        self.params.append(params)
+
+    def search(self, vector: np.ndarray, params: str, threshold: float, k: int = 8) -> Optional[Tuple[str, float]]:
+        """Best cached entry with the same retrieval params and similarity >= threshold."""
+        if self.index is None or self.index.ntotal == 0 or vector.shape[1] != self.index.d:
+            return None
+        sims, rows = self.index.search(vector, min(k, self.index.ntotal))
+        for sim, row in zip(sims[0], rows[0]):
+            if row < 0 or sim < threshold:
+                break
+            if self.params[row] == params:
+                return self.keys[row], float(sim)
+        return None
+
+    @staticmethod
+    def encode(key: str, params: str, vector: np.ndarray) -> str:
+        # The key leads, so entries already known are skipped without parsing the rest
+        return f"{key} " + json.dumps({"params": params, "vector": _encode_vector(vector)})
+
+    def decode_unseen(self, entries: List[str]) -> List[Tuple[str, str, np.ndarray]]:
+        """(key, params, vector) of the list entries not added or skipped yet."""
+        decoded = []
+        for entry in entries:
+            key, _, value = entry.partition(" ")
+            if key not in self._known:
+                data = json.loads(value)
+                decoded.append((key, data["params"], _decode_vector(data["vector"]).reshape(1, -1)))
+        return decoded
+
+
+class TTLLRUCache:
+    """In-process LRU with per-entry expiry, the L1 tier in front of Redis.
+
+    Only touched from the event loop, so it needs no lock.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any):
+        if self.max_entries <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def clear(self) -> int:
+        count = len(self._data)
+        self._data.clear()
+        return count
+
+
+class CircuitBreaker:
+    """Skips Redis after `failure_threshold` consecutive errors.
+
+    While open every call is refused without a network round trip. After
+    `reset_timeout` seconds one probe is let through; success closes the
+    breaker again, failure keeps it open for another period.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "half-open":
+            # Let exactly one probe through; everyone else waits for its outcome
+            self.opened_at = time.monotonic()
+            return True
+        return state == "closed"
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("Redis is reachable again, cache circuit closed")
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Redis failed {self.failures} times in a row, serving from L1 only for {self.reset_timeout}s")
+            self.opened_at = time.monotonic()
+
+
 class RedisCache:
-    """Redis cache for storing query-answer pairs."""
+    """Two-tier cache for the stages of a query.
+
+    Three layers, each keyed on what it actually depends on:
+    - query text -> query embedding (independent of the index)
+    - query + top_k + fusion params + index version -> ranked chunk IDs
+    - query + chunk IDs + index version -> answer and sources
+
+    Every key also carries the cache generation, a counter in Redis that
+    clear() bumps. Old keys are never deleted in bulk: nothing reads them
+    any more and they expire on their TTL, or the optional sweeper UNLINKs
+    them in small SCAN batches. A reindex needs no bump since the index
+    version is already part of the key.
+
+    L1 is a per-process TTL-LRU, so hot questions are answered without a
+    network hop. L2 is Redis through a pooled asyncio client, guarded by a
+    circuit breaker: while Redis is down the cache keeps working from L1 and
+    reconnects on its own once Redis is back.
+    """
     
     _instance: Optional['RedisCache'] = None
     
@@ -24,86 +230,407 @@ class RedisCache:
             return
         self._initialized = True
         
-        self.client: Optional[redis.Redis] = None
-        self.enabled = False
+        self.local = TTLLRUCache(settings.CACHE_L1_MAX_ENTRIES, settings.CACHE_L1_TTL)
+        self.breaker = CircuitBreaker(settings.CACHE_BREAKER_FAILURES, settings.CACHE_BREAKER_RESET)
+        self.client: Optional[aioredis.Redis] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._semantic: Optional[SemanticIndex] = None
+        self._generation = 0
+        self._generation_checked = 0.0
+        self._sweeper: Optional[asyncio.Task] = None
+        self._counters: Dict[str, Dict[str, int]] = {}
         self._connect()
     
     def _connect(self):
-        """Connect to Redis server."""
+        """Create the pooled Redis client. Connections are opened lazily and re-opened after errors."""
         if not settings.REDIS_URL:
-            logger.warning("REDIS_URL not set. Caching disabled.")
+            logger.warning("REDIS_URL not set. Caching in-process only.")
             return
-            
+        
+        self.client = aioredis.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            socket_timeout=settings.REDIS_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_TIMEOUT,
+            health_check_interval=30,
+        )
+        logger.info(f"Using Redis cache at {settings.REDIS_URL}")
+    
+    async def _redis(self, call: Callable[[aioredis.Redis], Awaitable[Any]]) -> Any:
+        """Run one Redis call through the circuit breaker. Returns None when Redis is unavailable."""
+        if self.client is None or not self.breaker.allow():
+            return None
         try:
-            self.client = redis.from_url(
-                settings.REDIS_URL,
-                decode_responses=True
+            result = await call(self.client)
+        except (redis.ConnectionError, redis.TimeoutError, OSError, asyncio.TimeoutError) as e:
+            logger.warning(f"Redis call failed: {e}")
+            self.breaker.record_failure()
+            return None
+        except redis.RedisError as e:
+            # The server answered, so this says nothing about its availability
+            logger.warning(f"Redis command error: {e}")
+            return None
+        self.breaker.record_success()
+        return result
+    
+    async def _refresh_generation(self, force: bool = False):
+        """Re-read the shared generation, at most every CACHE_GENERATION_REFRESH seconds."""
+        now = time.monotonic()
+        if not force and now - self._generation_checked < settings.CACHE_GENERATION_REFRESH:
+            return
+        self._generation_checked = now
+        value = await self._redis(lambda client: client.get(GENERATION_KEY))
+        if value is not None and int(value) != self._generation:
+            logger.info(f"Cache generation {self._generation} -> {value}")
+            self._generation = int(value)
+    
+    def _count(self, kind: str, outcome: str):
+        counters = self._counters.setdefault(kind, {})
+        counters[outcome] = counters.get(outcome, 0) + 1
+        CACHE_LOOKUPS.labels(layer=kind, outcome=outcome).inc()
+    
+    @property
+    def semantic_enabled(self) -> bool:
+        return settings.SEMANTIC_CACHE
+    
+    def embedding_key(self, query: str) -> str:
+        model = _digest(settings.LOCAL_EMBEDDING_MODEL, settings.EMBEDDING_BACKEND)[:8]
+        return f"rag:embed:g{self._generation}:{model}:{_digest(query.strip())}"
+    
+    def retrieval_key(self, query: str, top_k: int, params: str = "", index_version: Optional[int] = None) -> str:
+        namespace = _namespace(self._generation, index_version)
+        return f"rag:retrieval:{namespace}:{_digest(query.lower().strip(), str(top_k), params)}"
+    
+    def answer_key(self, query: str, chunk_ids: List[str], params: str = "", index_version: Optional[int] = None) -> str:
+        namespace = _namespace(self._generation, index_version)
+        return f"rag:answer:{namespace}:{_digest(query.lower().strip(), ','.join(chunk_ids), params)}"
+    
+    async def _fetch(self, key: str) -> Optional[Any]:
+        """L1, then L2; L2 hits are promoted into L1."""
+        kind = key.split(":", 2)[1]
+        data = self.local.get(key)
+        if data is not None:
+            self._count(kind, "l1_hits")
+            return data
+        cached = await self._redis(lambda client: client.get(key))
+        if not cached:
+            self._count(kind, "misses")
+            return None
+        self._count(kind, "l2_hits")
+        data = json.loads(cached)
+        self.local.set(key, data)
+        return data
+    
+    async def _store(self, key: str, data: Any):
+        self.local.set(key, data)
+        await self._redis(lambda client: client.setex(key, settings.CACHE_TTL, json.dumps(data)))
+    
+    def _semantic_index(self, index_version: Optional[int]) -> SemanticIndex:
+        namespace = _namespace(self._generation, index_version)
+        if self._semantic is None or self._semantic.namespace != namespace:
+            self._semantic = SemanticIndex(namespace, settings.SEMANTIC_CACHE_MAX_ENTRIES)
+        return self._semantic
+    
+    async def _sync_semantic(self, index: SemanticIndex):
+        """Read entries other workers appended since the last sync, at most every CACHE_GENERATION_REFRESH seconds.
+
+        Only the unread tail of the list is fetched, in CACHE_SCAN_COUNT batches,
+        and decoded off the event loop.
+        """
+        now = time.monotonic()
+        if index.full or now - index.synced_at < settings.CACHE_GENERATION_REFRESH:
+            return
+        index.synced_at = now
+        batch = settings.CACHE_SCAN_COUNT
+        while not index.full:
+            start = index.offset
+            result = await self._redis(
+                lambda client: client.pipeline(transaction=False)
+                .llen(index.redis_key)
+                .lrange(index.redis_key, start, start + batch - 1)
+                .execute()
             )
-            # Test connection
-            self.client.ping()
-            self.enabled = True
-            logger.info(f"Connected to Redis at {settings.REDIS_URL}")
-        except redis.ConnectionError as e:
-            logger.warning(f"Failed to connect to Redis: {e}. Caching disabled.")
-            self.enabled = False
-    
-    def _get_cache_key(self, query: str, top_k: int) -> str:
-        """Generate cache key from query and parameters."""
-        key_data = f"{query.lower().strip()}:{top_k}"
-        return f"rag:query:{hashlib.md5(key_data.encode()).hexdigest()}"
-    
-    def get(self, query: str, top_k: int = 8) -> Optional[Dict[str, Any]]:
-        """Get cached response for a query."""
-        if not self.enabled or not self.client:
+            if result is None:
+                return
+            length, entries = result
+            if length < start:
+                # The list expired and was started again
+                index.offset = 0
+                continue
+            decoded = await asyncio.to_thread(index.decode_unseen, entries)
+            for key, params, vector in decoded:
+                index.add(key, params, vector)
+            index.offset = max(index.offset, start + len(entries))
+            if len(entries) < batch:
+                return
+    
+    async def _semantic_lookup(self, query_vector: Sequence[float], params: str, index_version: Optional[int]) -> Optional[Tuple[str, float]]:
+        vector = SemanticIndex.normalize(query_vector)
+        threshold = settings.SEMANTIC_CACHE_THRESHOLD
+        index = self._semantic_index(index_version)
+        match = index.search(vector, params, threshold)
+        if match is None:
+            await self._sync_semantic(index)
+            match = index.search(vector, params, threshold)
+        return match
+    
+    async def get_embedding(self, query: str) -> Optional[np.ndarray]:
+        try:
+            await self._refresh_generation()
+            data = await self._fetch(self.embedding_key(query))
+            return _decode_vector(data["vector"]) if data else None
+        except Exception as e:
+            logger.error(f"Cache get error: {e}")
             return None
-            
+    
+    async def set_embedding(self, query: str, vector: np.ndarray):
+        try:
+            await self._store(self.embedding_key(query), {"vector": _encode_vector(vector)})
+        except Exception as e:
+            logger.error(f"Cache set error: {e}")
+    
+    async def get_retrieval(
+        self, query: str, top_k: int, params: str = "", index_version: Optional[int] = None
+    ) -> Optional[List[Tuple[str, float]]]:
+        """Ranked (chunk_id, score) pairs of an earlier identical search."""
+        try:
+            await self._refresh_generation()
+            data = await self._fetch(self.retrieval_key(query, top_k, params, index_version))
+            return [(chunk_id, score) for chunk_id, score in data["hits"]] if data else None
+        except Exception as e:
+            logger.error(f"Cache get error: {e}")
+            return None
+    
+    async def set_retrieval(
+        self, query: str, top_k: int, params: str, index_version: Optional[int], hits: List[Tuple[str, float]]
+    ):
+        try:
+            await self._store(self.retrieval_key(query, top_k, params, index_version), {"hits": [list(hit) for hit in hits]})
+        except Exception as e:
+            logger.error(f"Cache set error: {e}")
+    
+    async def get_answer(
+        self, query: str, chunk_ids: List[str], params: str = "", index_version: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Answer generated earlier for this query over exactly these chunks and generation params."""
         try:
-            key = self._get_cache_key(query, top_k)
-            cached = self.client.get(key)
-            if cached:
+            data = await self._fetch(self.answer_key(query, chunk_ids, params, index_version))
+            if data:
                 logger.info(f"Cache hit for query: {query[:50]}...")
-                return json.loads(cached)
+            return data
+        except Exception as e:
+            logger.error(f"Cache get error: {e}")
+            return None
+    
+    async def find_similar(
+        self, query_vector: Sequence[float], top_k: int, params: str = "", index_version: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Answer of the closest already answered paraphrase, if similar enough."""
+        if not settings.SEMANTIC_CACHE:
             return None
+        try:
+            match = await self._semantic_lookup(query_vector, f"{top_k}:{params}", index_version)
+            data = await self._fetch(match[0]) if match else None
+            if not data:
+                # No close paraphrase, or its answer expired while the embedding is still indexed
+                self._count("semantic", "misses")
+                return None
+            matched_key, similarity = match
+            self._count("semantic", "hits")
+            logger.info(f"Semantic cache hit ({similarity:.3f})")
+            return {**data, "similarity": round(similarity, 4)}
         except Exception as e:
             logger.error(f"Cache get error: {e}")
             return None
     
-    def set(self, query: str, top_k: int, answer: str, sources: list) -> bool:
-        """Cache a query response."""
-        if not self.enabled or not self.client:
-            return False
-            
+    async def set_answer(
+        self,
+        query: str,
+        chunk_ids: List[str],
+        answer: str,
+        sources: list,
+        top_k: int,
+        params: str = "",
+        index_version: Optional[int] = None,
+        query_vector: Optional[Sequence[float]] = None,
+    ) -> bool:
+        """Cache an answer in both tiers, and its query embedding for semantic lookups."""
         try:
-            key = self._get_cache_key(query, top_k)
-            data = {
+            key = self.answer_key(query, chunk_ids, params, index_version)
+            await self._store(key, {
                 "answer": answer,
                 "sources": sources,
                 "cached": True
-            }
-            self.client.setex(
-                key,
-                settings.CACHE_TTL,
-                json.dumps(data)
-            )
+            })
+            if query_vector is not None and settings.SEMANTIC_CACHE:
+                await self._add_semantic(key, f"{top_k}:{params}", query_vector, index_version)
             logger.info(f"Cached response for query: {query[:50]}...")
             return True
         except Exception as e:
             logger.error(f"Cache set error: {e}")
             return False
     
-    def clear(self) -> int:
-        """Clear all RAG query cache entries."""
-        if not self.enabled or not self.client:
-            return 0
-            
+    async def _add_semantic(self, key: str, params: str, query_vector: Sequence[float], index_version: Optional[int]):
+        vector = SemanticIndex.normalize(query_vector)
+        index = self._semantic_index(index_version)
+        if index.full:
+            return
+        index.add(key, params, vector)
+        encoded = SemanticIndex.encode(key, params, vector)
+        await self._redis(
+            lambda client: client.pipeline()
+            .rpush(index.redis_key, encoded)
+            .expire(index.redis_key, settings.CACHE_TTL)
+            .execute()
+        )
+    
+    async def single_flight(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `fn` once per key at a time; concurrent callers with the same key share its result.
+        
+        Coalescing is per process, which is where the duplicate generations come from.
+        """
+        while (future := self._inflight.get(key)) is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leading request went away before finishing; take over from it
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
         try:
-            keys = self.client.keys("rag:query:*")
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved; nobody may be waiting
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+    
+    async def clear(self) -> int:
+        """Invalidate every cache layer by bumping the generation. Returns the new generation.
+        
+        O(1) on the Redis side; other workers switch within CACHE_GENERATION_REFRESH seconds.
+        """
+        self.local.clear()
+        self._semantic = None
+        generation = await self._redis(lambda client: client.incr(GENERATION_KEY))
+        # Without Redis only this worker's cache exists, so a local bump is enough
+        self._generation = int(generation) if generation is not None else self._generation + 1
+        self._generation_checked = time.monotonic()
+        logger.info(f"Cache cleared, now at generation {self._generation}")
+        return self._generation
+    
+    async def _scan(self) -> AsyncIterator[List[str]]:
+        """Cache keys in SCAN-sized batches; never blocks Redis the way KEYS does."""
+        cursor = 0
+        while True:
+            result = await self._redis(
+                lambda client: client.scan(cursor, match="rag:*", count=settings.CACHE_SCAN_COUNT)
+            )
+            if result is None:
+                return
+            cursor, keys = result
             if keys:
-                return self.client.delete(*keys)
-            return 0
-        except Exception as e:
-            logger.error(f"Cache clear error: {e}")
-            return 0
+                yield keys
+            if int(cursor) == 0:
+                return
+    
+    def _is_stale(self, key: str, live_version: Optional[int]) -> bool:
+        parts = key.split(":")
+        if len(parts) < 4 or not parts[2].startswith("g"):
+            return False
+        if parts[2] != f"g{self._generation}":
+            return True
+        if parts[1] in _VERSIONED_KINDS and live_version is not None:
+            # Only older versions; a worker may already serve a newer one than we know of
+            return int(parts[3][1:]) < live_version
+        return False
+    
+    async def sweep(self, live_version: Optional[int]) -> int:
+        """UNLINK keys of old generations and index versions. Returns how many were removed."""
+        await self._refresh_generation(force=True)
+        removed = 0
+        async for keys in self._scan():
+            stale = [key for key in keys if self._is_stale(key, live_version)]
+            if stale:
+                # UNLINK frees the memory on a background thread in Redis
+                removed += await self._redis(lambda client: client.unlink(*stale)) or 0
+        if removed:
+            logger.info(f"Cache sweeper removed {removed} stale keys")
+        return removed
+    
+    async def _sweep_loop(self, live_version: Callable[[], Optional[int]]):
+        while True:
+            await asyncio.sleep(settings.CACHE_SWEEP_INTERVAL)
+            try:
+                await self.sweep(live_version())
+            except Exception as e:
+                logger.error(f"Cache sweep failed: {e}")
+    
+    def start_sweeper(self, live_version: Callable[[], Optional[int]]):
+        """Start the background sweeper if CACHE_SWEEP_INTERVAL is set. Must run on the event loop."""
+        if settings.CACHE_SWEEP_INTERVAL <= 0 or self.client is None or self._sweeper is not None:
+            return
+        self._sweeper = asyncio.get_running_loop().create_task(self._sweep_loop(live_version))
+        logger.info(f"Cache sweeper running every {settings.CACHE_SWEEP_INTERVAL}s")
+    
+    async def stats(self) -> Dict[str, Any]:
+        """Hit rates per layer (this worker) and entries/bytes per Redis namespace."""
+        await self._refresh_generation(force=True)
+        layers = {}
+        for kind, counters in self._counters.items():
+            lookups = sum(counters.values())
+            hits = lookups - counters.get("misses", 0)
+            layers[kind] = {**counters, "hit_rate": round(hits / lookups, 4) if lookups else None}
+        
+        namespaces: Dict[str, Dict[str, Any]] = {}
+        async for keys in self._scan():
+            # MEMORY USAGE may be unavailable (e.g. restricted managed Redis); bytes are then null
+            sizes = await self._redis(
+                lambda client: self._memory_usage(client, keys)
+            ) or [None] * len(keys)
+            for key, size in zip(keys, sizes):
+                parts = key.split(":")
+                if len(parts) < 4:
+                    continue
+                depth = 4 if parts[1] in _VERSIONED_KINDS else 3
+                entry = namespaces.setdefault(":".join(parts[1:depth]), {"entries": 0, "bytes": 0})
+                entry["entries"] += 1
+                if isinstance(size, int) and entry["bytes"] is not None:
+                    entry["bytes"] += size
+                else:
+                    entry["bytes"] = None
+        
+        return {
+            "generation": self._generation,
+            "redis": {"configured": self.client is not None, "circuit": self.breaker.state},
+            "l1_entries": len(self.local),
+            "layers": layers,
+            "namespaces": namespaces,
+        }
+    
+    @staticmethod
+    async def _memory_usage(client: aioredis.Redis, keys: List[str]) -> List[Any]:
+        pipe = client.pipeline(transaction=False)
+        for key in keys:
+            pipe.memory_usage(key)
+        return await pipe.execute(raise_on_error=False)
+    
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        if self.client is not None:
+            await self.client.aclose()
 
 
 def get_cache() -> RedisCache:
@@ -0,0 +1,122 @@
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+_META_FILE = "meta.json"
+_COLUMNS = ("chunk_id", "text", "metadata")
+SNIPPET_CHARS = 200  # original_text_snippet, derived from the text instead of stored
+
+
+def _pack(values: List[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v in values], out=offsets[1:])
+    return np.frombuffer(b"".join(values), dtype=np.uint8), offsets
+
+
+class ChunkStore:
+    """Chunk IDs, texts and metadata of one index version, addressed by FAISS row id.
+
+    Each column is one UTF-8 blob plus an offsets array (row i is
+    blob[offsets[i]:offsets[i + 1]]), saved as .npy files that load() memory-maps
+    like the BM25 arrays. Nothing is kept per chunk in the Python heap: rows are
+    decoded on request, so searches only build Documents for the results they
+    return. `id_order` holds the rows sorted by chunk_id, for lookups by ID.
+    """
+
+    def __init__(self, columns: Dict[str, Tuple[np.ndarray, np.ndarray]], id_order: np.ndarray):
+        self._columns = columns
+        self.id_order = id_order
+
+    def __len__(self) -> int:
+        return len(self.id_order)
+
+    @classmethod
+    def build(cls, documents: Iterable[Document]) -> 'ChunkStore':
+        values: Dict[str, List[bytes]] = {name: [] for name in _COLUMNS}
+        for doc in documents:
+            # chunk_id has its own column and the snippet is a prefix of the text
+            metadata = {k: v for k, v in doc.metadata.items() if k not in ("chunk_id", "original_text_snippet")}
+            values["chunk_id"].append(doc.metadata["chunk_id"].encode("utf-8"))
+            values["text"].append(doc.page_content.encode("utf-8"))
+            values["metadata"].append(json.dumps(metadata).encode("utf-8"))
+        ids = values["chunk_id"]
+        # UTF-8 byte order is code point order, so lookups can compare the raw bytes
+        id_order = np.array(sorted(range(len(ids)), key=ids.__getitem__), dtype=np.int64)
+        columns = {name: _pack(parts) for name, parts in values.items()}
+        logger.info(f"Built chunk store: {len(ids)} chunks, {columns['text'][0].nbytes} bytes of text")
+        return cls(columns, id_order)
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        for name, (blob, offsets) in self._columns.items():
+            np.save(os.path.join(directory, f"{name}.npy"), blob)
+            np.save(os.path.join(directory, f"{name}_offsets.npy"), offsets)
+        np.save(os.path.join(directory, "id_order.npy"), self.id_order)
+        with open(os.path.join(directory, _META_FILE), 'w') as f:
+            json.dump({"num_rows": len(self), "columns": list(_COLUMNS)}, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'ChunkStore':
+        """Open a saved store. With mmap the columns stay in the OS page cache rather than the heap."""
+        mode = "r" if mmap else None
+        columns = {
+            name: (
+                np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode),
+                np.load(os.path.join(directory, f"{name}_offsets.npy"), mmap_mode=mode),
+            )
+            for name in _COLUMNS
+        }
+        return cls(columns, np.load(os.path.join(directory, "id_order.npy"), mmap_mode=mode))
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, _META_FILE))
+
+    def _value(self, name: str, row: int) -> bytes:
+        blob, offsets = self._columns[name]
+        return blob[offsets[row]:offsets[row + 1]].tobytes()
+
+    def chunk_id(self, row: int) -> str:
+        return self._value("chunk_id", row).decode("utf-8")
+
+    def text(self, row: int) -> str:
+        return self._value("text", row).decode("utf-8")
+
+    def texts(self) -> Iterator[str]:
+        for row in range(len(self)):
+            yield self.text(row)
+
+    def metadata(self, row: int, text: Optional[str] = None) -> Dict[str, Any]:
+        metadata = json.loads(self._value("metadata", row))
+        text = self.text(row) if text is None else text
+        return {**metadata, "chunk_id": self.chunk_id(row), "original_text_snippet": text[:SNIPPET_CHARS]}
+
+    def document(self, row: int, score: Optional[float] = None) -> Document:
+        """A fresh Document for the row, with `score` added to its metadata if given."""
+        text = self.text(row)
+        metadata = self.metadata(row, text)
+        if score is not None:
+            metadata["score"] = score
+        return Document(page_content=text, metadata=metadata)
+
+    def row(self, chunk_id: str) -> Optional[int]:
+        """Row of `chunk_id` by binary search over id_order, or None if it is not in this version."""
+        target = chunk_id.encode("utf-8")
+        lo, hi = 0, len(self.id_order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._value("chunk_id", int(self.id_order[mid])) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.id_order):
+            row = int(self.id_order[lo])
+            if self._value("chunk_id", row) == target:
+                return row
+        return None
@@ -14,17 +14,82 @@ class Settings(BaseSettings):
     EMBEDDING_MODEL: str = "models/gemini-embedding-001"
     GENERATION_MODEL: str = "gemini-2.5-flash"
     
+    # Generation backend: "gemini", "stub" (deterministic, offline) or "llama_cpp"
+    GENERATION_BACKEND: str = "gemini"
+    STUB_FIRST_TOKEN_MS: float = 300.0  # Simulated time to first token
+    STUB_TOKENS_PER_SECOND: float = 50.0
+    STUB_ANSWER_TOKENS: int = 64  # Words per stub answer, capped by the request's max_tokens
+    LLAMA_MODEL_PATH: str = ""  # GGUF file for llama_cpp
+    LLAMA_CONTEXT_SIZE: int = 4096
+    LLAMA_THREADS: int = 0  # 0 lets llama.cpp decide
+    
+    # Local embeddings (shared by ingestion and retrieval, loaded on first use)
+    LOCAL_EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_BACKEND: str = "torch"  # "torch", "onnx" or "onnx-int8" (needs optimum[onnxruntime])
+    EMBEDDING_ONNX_FILE: str = ""  # Quantized export used by "onnx-int8"; empty picks the one for this CPU
+    
     # Paths
     DATA_DIR: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), "data")
-    KNOWLEDGE_FILE: str = "uffizio_knowledge.txt"
+    KNOWLEDGE_FILE: str = "uffizio_knowledge.txt"  # A file, or a directory of them (relative to DATA_DIR)
+    KNOWLEDGE_GLOB: str = "*.txt"  # Files ingested when KNOWLEDGE_FILE is a directory
     INDEX_FILE: str = "faiss_index.bin"
     METADATA_FILE: str = "metadata.jsonl"
     
     # RAG
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
-    BATCH_SIZE: int = 10
+    BATCH_SIZE: int = 64  # Initial embedding batch size; adapted during ingestion
+    MAX_BATCH_SIZE: int = 512
+    EMBED_PROCESSES: int = 0  # >0 embeds on that many worker processes (one model copy each)
+    CHUNK_PROCESSES: int = 0  # >0 splits documents into chunks on that many worker processes
     TOP_K: int = 8
+    CONTEXT_MAX_TOKENS: int = 3000  # Prompt budget for retrieved context (estimated at ~4 chars/token)
+    MAX_ANSWER_TOKENS: int = 8192  # Upper bound for a request's max_tokens
+    CONTEXT_DEDUP_THRESHOLD: float = 0.8  # Word-shingle Jaccard at which a passage counts as a duplicate
+    
+    # Retrieval execution
+    RETRIEVAL_EXECUTOR: str = "thread"  # "thread" or "process"
+    RETRIEVAL_WORKERS: int = 16  # Workers mostly wait on the query batcher, so this also caps batch size
+    RETRIEVAL_MAX_QUEUE: int = 32  # Pending searches beyond the busy workers before we return 503
+    
+    # POST /query/batch
+    BATCH_QUERY_MAX: int = 5000  # Queries per request
+    BATCH_QUERY_SIZE: int = 64  # Queries embedded and searched together
+    BATCH_GENERATION_CONCURRENCY: int = 4  # Answers generated at once for batch requests, per worker process
+    BATCH_SATURATED_WAIT: float = 10.0  # Seconds a batch slice waits for a free retrieval slot before its queries fail
+    
+    # Query micro-batching (concurrent queries share one embedding pass + FAISS search)
+    QUERY_BATCHING: bool = True
+    QUERY_BATCH_MAX_SIZE: int = 32
+    QUERY_BATCH_MAX_WAIT_MS: float = 5.0
+    
+    # Versioned index directories (faiss_index/v{N}/ + current.json)
+    INDEX_KEEP_VERSIONS: int = 2  # Versions kept on disk, including the live one
+    INDEX_WATCH_INTERVAL: float = 2.0  # Seconds between checks for a newly published version; 0 disables
+    BM25_MMAP: bool = True  # Memory-map the saved BM25 arrays (shared page cache across workers)
+    CHUNKS_MMAP: bool = True  # Memory-map the chunk store (texts and metadata), likewise
+    
+    # Dense vector index. Vectors are normalized and searched by inner product (cosine).
+    # "flat" is exact; "hnsw", "ivf_flat" and "ivf_pq" are approximate indexes built
+    # next to it at ingestion. Tune the search knobs with benchmarks/tune_ann.py
+    VECTOR_INDEX_TYPE: str = "flat"
+    ANN_MIN_VECTORS: int = 10000  # Smaller indexes stay exact; a flat scan is just as fast there
+    HNSW_M: int = 32  # Graph neighbours per vector
+    HNSW_EF_CONSTRUCTION: int = 200
+    HNSW_EF_SEARCH: int = 64  # Higher finds more true neighbours, slower
+    IVF_NLIST: int = 0  # Inverted lists; 0 picks ~4*sqrt(N)
+    IVF_NPROBE: int = 16  # Lists scanned per query
+    IVF_PQ_M: int = 0  # PQ sub-quantizers (bytes per vector); 0 picks dim/4, 16x smaller than float32
+    VECTOR_COMPRESSION: str = "none"  # "sq8" (4x smaller) or "pq" codes in the search index; hits are re-scored exactly
+    VECTOR_MMAP: bool = True  # Memory-map index files when serving (one shared copy in the page cache across workers)
+    
+    # Hybrid fusion: "weighted" (raw scores), "minmax", "zscore" or "rrf"
+    FUSION_STRATEGY: str = "weighted"
+    HYBRID_ALPHA: float = 0.7  # Weight of the dense signal
+    RRF_K: int = 60
+    
+    # Observability (GET /metrics is always on)
+    SERVER_TIMING: bool = False  # Per-stage timing breakdown of /query in a Server-Timing response header
     
     # Auth
     API_KEY_HEADER: str = "x-api-key"
@@ -33,6 +98,22 @@ class Settings(BaseSettings):
     # Redis Cache
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379")
     CACHE_TTL: int = int(os.getenv("CACHE_TTL", "86400"))  # 24 hours default
+    REDIS_MAX_CONNECTIONS: int = 32  # Pooled connections per worker
+    REDIS_TIMEOUT: float = 0.5  # Seconds; a slow Redis counts as a failure rather than stalling requests
+    CACHE_BREAKER_FAILURES: int = 3  # Consecutive Redis errors before the cache falls back to L1 only
+    CACHE_BREAKER_RESET: float = 30.0  # Seconds before Redis is probed again
+    CACHE_GENERATION_REFRESH: float = 5.0  # Seconds between reads of the shared cache generation
+    CACHE_SWEEP_INTERVAL: float = 0.0  # Seconds between SCAN/UNLINK sweeps of stale keys; 0 leaves them to expire
+    CACHE_SCAN_COUNT: int = 500  # SCAN batch size for the sweeper and /cache/stats; also entries per semantic cache sync read
+    
+    # In-process L1 cache in front of Redis (per worker)
+    CACHE_L1_MAX_ENTRIES: int = 1024
+    CACHE_L1_TTL: int = 300  # Short, so a /cache/clear on another worker is picked up soon
+    
+    # Semantic cache (answers reused for paraphrased queries, per index version)
+    SEMANTIC_CACHE: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92  # Minimum cosine similarity between query embeddings
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 10000  # Per index version; further answers are only cached exactly
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,122 @@
+import logging
+import re
+from typing import List, Optional, Set
+from langchain_core.documents import Document
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+_MIN_OVERLAP = 20  # Shorter shared edges are coincidence, not splitter overlap
+_MIN_TAIL_TOKENS = 64  # Don't bother squeezing in a truncated later passage smaller than this
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting a prompt."""
+    return (len(text) + 3) // 4
+
+
+def _shingles(text: str, size: int = 3) -> Set[str]:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _overlap(left: str, right: str, window: int) -> int:
+    """Length of the longest suffix of `left` that `right` starts with (0 if none)."""
+    probe = right[:_MIN_OVERLAP]
+    if len(probe) < _MIN_OVERLAP:
+        return 0
+    start = max(0, len(left) - window)
+    while (pos := left.find(probe, start)) != -1:
+        if right.startswith(left[pos:]):
+            return len(left) - pos
+        start = pos + 1
+    return 0
+
+
+class _Passage:
+    def __init__(self, doc: Document):
+        self.doc_key = doc.metadata.get("doc_key")
+        self.text = doc.page_content
+
+    def absorb(self, doc_key: Optional[str], text: str, window: int) -> bool:
+        """Stitch a neighbouring chunk (or passage) of the same document onto either end."""
+        if self.doc_key is None or doc_key != self.doc_key:
+            return False
+        if text in self.text:
+            return True
+        if n := _overlap(self.text, text, window):
+            self.text += text[n:]
+            return True
+        if n := _overlap(text, self.text, window):
+            self.text = text + self.text[n:]
+            return True
+        return False
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    cut = text[:max_tokens * 4]
+    # Prefer ending on a sentence, then on a word
+    end = max(cut.rfind(". "), cut.rfind("\n"))
+    if end < len(cut) // 2:
+        end = cut.rfind(" ")
+    return cut[:end + 1].rstrip() if end > 0 else cut
+
+
+def build_context(docs: List[Document], max_tokens: Optional[int] = None, dedup_threshold: Optional[float] = None) -> str:
+    """Context for the prompt from ranked chunks.
+
+    Overlapping chunks of the same document are merged back into one passage,
+    near-duplicate passages (word-shingle Jaccard >= `dedup_threshold`) are
+    dropped, and passages are added best-first until `max_tokens` is reached;
+    the last one is truncated to fill the remaining budget. The best passage is
+    always included, truncated if it alone exceeds the budget.
+    """
+    max_tokens = settings.CONTEXT_MAX_TOKENS if max_tokens is None else max_tokens
+    dedup_threshold = settings.CONTEXT_DEDUP_THRESHOLD if dedup_threshold is None else dedup_threshold
+    window = settings.CHUNK_OVERLAP * 2
+
+    # 1. Merge overlapping neighbours, keeping the rank of the best chunk
+    passages: List[_Passage] = []
+    for doc in docs:
+        if not any(p.absorb(doc.metadata.get("doc_key"), doc.page_content, window) for p in passages):
+            passages.append(_Passage(doc))
+    # A later chunk can bridge two earlier passages of the same document
+    merged: List[_Passage] = []
+    for passage in passages:
+        if not any(m.absorb(passage.doc_key, passage.text, window) for m in merged):
+            merged.append(passage)
+    passages = merged
+
+    # 2. Drop near-duplicates of better-ranked passages
+    kept: List[str] = []
+    kept_shingles: List[Set[str]] = []
+    for passage in passages:
+        shingles = _shingles(passage.text)
+        if any(len(shingles & other) / len(shingles | other) >= dedup_threshold for other in kept_shingles):
+            continue
+        kept.append(passage.text)
+        kept_shingles.append(shingles)
+
+    # 3. Fit to the token budget
+    parts: List[str] = []
+    used = 0
+    for text in kept:
+        tokens = estimate_tokens(text)
+        if used + tokens > max_tokens:
+            remaining = max_tokens - used
+            if remaining > 0 and (not parts or remaining >= _MIN_TAIL_TOKENS):
+                parts.append(_truncate(text, remaining))
+            break
+        parts.append(text)
+        used += tokens + 1  # separator
+
+    context = "\n\n".join(parts)
+    raw_tokens = sum(estimate_tokens(d.page_content) for d in docs)
+    logger.info(
+        f"Context: {len(docs)} chunks -> {len(passages)} passages -> {len(parts)} used, "
+        f"~{raw_tokens} -> ~{estimate_tokens(context)} tokens"
+    )
+    return context
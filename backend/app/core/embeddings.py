@@ -0,0 +1,106 @@
+import logging
+import platform
+import threading
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from langchain_core.embeddings import Embeddings
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LazyEmbeddings(Embeddings):
+    """Embeddings proxy that builds the real model on first use.
+
+    Handing this to FAISS.load_local or IngestionManager costs nothing until
+    something is actually embedded.
+    """
+
+    def __init__(self, factory: Callable[[], Embeddings], name: str):
+        self._factory = factory
+        self._model: Optional[Embeddings] = None
+        self._lock = threading.Lock()
+        self.name = name
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def model(self) -> Embeddings:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    logger.info(f"Loading embedding model {self.name}")
+                    self._model = self._factory()
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.model.embed_query(text)
+
+
+def _cpu_flags() -> Set[str]:
+    # Linux only; elsewhere the flags are unknown
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def _onnx_int8_file() -> str:
+    """The quantized ONNX export (as named in sentence-transformers model repos) this CPU can run.
+
+    EMBEDDING_ONNX_FILE wins when set. The AVX-512 kernels die with an illegal
+    instruction on CPUs without AVX-512, so the AVX2 export is the fallback on x86.
+    """
+    if settings.EMBEDDING_ONNX_FILE:
+        return settings.EMBEDDING_ONNX_FILE
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "onnx/model_qint8_arm64.onnx"
+    flags = _cpu_flags()
+    if "avx512_vnni" in flags:
+        return "onnx/model_qint8_avx512_vnni.onnx"
+    if "avx512f" in flags and "avx512bw" in flags:
+        return "onnx/model_qint8_avx512.onnx"
+    return "onnx/model_quint8_avx2.onnx"
+
+
+def _build_huggingface(model_name: str, backend: str) -> Embeddings:
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    # model_kwargs are passed straight to SentenceTransformer(...)
+    if backend == "torch":
+        model_kwargs = {}
+    elif backend == "onnx":
+        model_kwargs = {"backend": "onnx"}
+    elif backend == "onnx-int8":
+        file_name = _onnx_int8_file()
+        logger.info(f"Using quantized ONNX export {file_name}")
+        model_kwargs = {"backend": "onnx", "model_kwargs": {"file_name": file_name}}
+    else:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    return HuggingFaceEmbeddings(model_name=model_name, model_kwargs=model_kwargs)
+
+
+_registry: Dict[Tuple[str, str], LazyEmbeddings] = {}
+_registry_lock = threading.Lock()
+
+
+def get_embeddings(model_name: Optional[str] = None, backend: Optional[str] = None) -> LazyEmbeddings:
+    """Process-wide shared embedding model, one instance per (model, backend)."""
+    model_name = model_name or settings.LOCAL_EMBEDDING_MODEL
+    backend = backend or settings.EMBEDDING_BACKEND
+    key = (model_name, backend)
+    with _registry_lock:
+        if key not in _registry:
+            _registry[key] = LazyEmbeddings(
+                lambda: _build_huggingface(model_name, backend),
+                name=f"{model_name} ({backend})",
+            )
+        return _registry[key]
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import List, Dict, Tuple, Optional
+import numpy as np
+from langchain_core.documents import Document
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RetrievalSaturatedError(Exception):
+    """Raised when the retrieval pool already has the maximum number of pending searches."""
+
+
+def _run_search(
+    query: str,
+    top_k: int,
+    alpha: Optional[float],
+    fusion: Optional[str],
+    query_vector: Optional[np.ndarray],
+    submitted_at: float,
+) -> Tuple[List[Document], Dict[str, float], Optional[np.ndarray]]:
+    # Runs on a pool worker. In process mode each worker imports (and loads) its own retriever.
+    from app.core.retrieval import retriever
+
+    timings = {"queue_wait_ms": (time.time() - submitted_at) * 1000}
+    docs, query_vector = retriever.search_with_vector(
+        query, top_k=top_k, alpha=alpha, fusion=fusion, timings=timings, query_vector=query_vector
+    )
+    return docs, timings, query_vector
+
+
+def _run_search_batch(
+    queries: List[str],
+    top_k: int,
+    alpha: Optional[float],
+    fusion: Optional[str],
+    query_vectors: Optional[List[Optional[np.ndarray]]],
+    submitted_at: float,
+) -> Tuple[List[List[Document]], Dict[str, float], Optional[np.ndarray]]:
+    from app.core.retrieval import retriever
+
+    timings = {"queue_wait_ms": (time.time() - submitted_at) * 1000}
+    results, query_vectors = retriever.search_batch(
+        queries, top_k=top_k, alpha=alpha, fusion=fusion, timings=timings, query_vectors=query_vectors
+    )
+    return results, timings, query_vectors
+
+
+class RetrievalExecutor:
+    """Runs HybridRetriever.search off the event loop on a bounded worker pool."""
+
+    _instance: Optional['RetrievalExecutor'] = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self._initialized = True
+
+        self.mode = settings.RETRIEVAL_EXECUTOR
+        self.max_workers = settings.RETRIEVAL_WORKERS
+        # Searches running on a worker plus searches waiting for one
+        self.max_pending = settings.RETRIEVAL_WORKERS + settings.RETRIEVAL_MAX_QUEUE
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool: Optional[Executor] = None
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.mode == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="retrieval")
+            logger.info(f"Started {self.mode} retrieval pool with {self.max_workers} workers")
+        return self._pool
+
+    def _claim(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise RetrievalSaturatedError(f"{self._pending} searches already pending")
+            self._pending += 1
+
+    def _unclaim(self):
+        with self._lock:
+            self._pending -= 1
+
+    async def search(
+        self,
+        query: str,
+        top_k: int = 8,
+        alpha: Optional[float] = None,
+        fusion: Optional[str] = None,
+        query_vector: Optional[np.ndarray] = None,
+    ) -> Tuple[List[Document], Dict[str, float], Optional[np.ndarray]]:
+        """Run a search on the pool. Returns the documents, per-stage timings in ms and the query vector.
+
+        Without a `query_vector` the query is embedded on the pool too (batched
+        with concurrent searches when the QueryBatcher is on).
+        """
+        self._claim()
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            docs, timings, query_vector = await loop.run_in_executor(
+                self._get_pool(), _run_search, query, top_k, alpha, fusion, query_vector, time.time()
+            )
+        finally:
+            self._unclaim()
+
+        timings["total_ms"] = (time.perf_counter() - start) * 1000
+        return docs, timings, query_vector
+
+    async def search_batch(
+        self,
+        queries: List[str],
+        top_k: int = 8,
+        alpha: Optional[float] = None,
+        fusion: Optional[str] = None,
+        query_vectors: Optional[List[Optional[np.ndarray]]] = None,
+    ) -> Tuple[List[List[Document]], Dict[str, float], Optional[np.ndarray]]:
+        """Run a batched search (HybridRetriever.search_batch) on the pool; it takes one slot like a single search.
+
+        Returns the results, timings and query vectors; None entries in `query_vectors` are embedded on the pool.
+        """
+        self._claim()
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            results, timings, query_vectors = await loop.run_in_executor(
+                self._get_pool(), _run_search_batch, queries, top_k, alpha, fusion, query_vectors, time.time()
+            )
+        finally:
+            self._unclaim()
+
+        timings["total_ms"] = (time.perf_counter() - start) * 1000
+        return results, timings, query_vectors
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def reload(self):
+        """Recycle process workers so they pick up a freshly built index.
+
+        Thread workers share the in-process retriever, so nothing to do there.
+        """
+        if self.mode == "process" and self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+def get_retrieval_executor() -> RetrievalExecutor:
+    """Get or create the retrieval executor instance."""
+    return RetrievalExecutor()
@@ -0,0 +1,54 @@
+import numpy as np
+
+FUSION_STRATEGIES = ("weighted", "minmax", "zscore", "rrf")
+
+
+def _minmax(scores: np.ndarray) -> np.ndarray:
+    spread = scores.max() - scores.min()
+    if spread <= 0:
+        return np.zeros_like(scores)
+    return (scores - scores.min()) / spread
+
+
+def _zscore(scores: np.ndarray) -> np.ndarray:
+    std = scores.std()
+    if std <= 0:
+        return np.zeros_like(scores)
+    return (scores - scores.mean()) / std
+
+
+def fuse_scores(
+    strategy: str,
+    dense_scores: np.ndarray,
+    lexical_scores: np.ndarray,
+    dense_ranks: np.ndarray,
+    lexical_ranks: np.ndarray,
+    alpha: float = 0.7,
+    rrf_k: int = 60,
+) -> np.ndarray:
+    """Combine dense and lexical evidence for one candidate list.
+
+    All arrays are aligned with the candidates. `dense_scores` are similarities
+    (higher is better) and `lexical_scores` raw BM25. Ranks are 1-based positions
+    in each retriever's own result list, np.inf where a candidate was not returned.
+
+    - weighted: alpha * similarity + (1 - alpha) * raw BM25 (legacy; BM25 dominates)
+    - minmax:   same blend after scaling each signal to [0, 1] over the candidates
+    - zscore:   same blend after standardizing each signal over the candidates
+    - rrf:      reciprocal rank fusion, sum of 1 / (rrf_k + rank); ignores alpha
+    """
+    if len(dense_scores) == 0:
+        return np.zeros(0, dtype=np.float64)
+
+    dense_scores = np.asarray(dense_scores, dtype=np.float64)
+    lexical_scores = np.asarray(lexical_scores, dtype=np.float64)
+
+    if strategy == "weighted":
+        return alpha * dense_scores + (1 - alpha) * lexical_scores
+    if strategy == "minmax":
+        return alpha * _minmax(dense_scores) + (1 - alpha) * _minmax(lexical_scores)
+    if strategy == "zscore":
+        return alpha * _zscore(dense_scores) + (1 - alpha) * _zscore(lexical_scores)
+    if strategy == "rrf":
+        return 1.0 / (rrf_k + np.asarray(dense_ranks, dtype=np.float64)) + 1.0 / (rrf_k + np.asarray(lexical_ranks, dtype=np.float64))
+    raise ValueError(f"Unknown fusion strategy: {strategy}")
@@ -1,9 +1,11 @@
 import logging
+import time
 from typing import List, AsyncGenerator, Optional
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
 from langchain_core.documents import Document
-from app.core.config import settings
+from app.core.context import build_context
+from app.core.generation_backends import GenerationBackend, create_generation_backend
+from app.core.metrics import GENERATED_TOKENS, STREAM_TOKENS_PER_SECOND, TIME_TO_FIRST_TOKEN, observe_stage, time_stage
 
 logger = logging.getLogger(__name__)
 
@@ -21,12 +23,8 @@ class RAGEngine:
             return
         self._initialized = True
         
-        self.llm = ChatGoogleGenerativeAI(
-            model=settings.GENERATION_MODEL,
-            google_api_key=settings.GEMINI_API_KEY,
-            temperature=0.2,
-            convert_system_message_to_human=True
-        )
+        # Gemini, the offline stub or a local model, per GENERATION_BACKEND
+        self.backend: GenerationBackend = create_generation_backend()
         
         self.prompt_template = PromptTemplate(
             template="""Use the following pieces of context to answer the question at the end. 
@@ -41,11 +39,12 @@ Question: {question}
 Answer:""",
             input_variables=["context", "question"]
         )
-        
-        self.chain = self.prompt_template | self.llm
 
-    async def generate(self, query: str, context_docs: List[Document], stream: bool = False):
-        context_text = "\n\n".join([doc.page_content for doc in context_docs])
+    async def generate(self, query: str, context_docs: List[Document], stream: bool = False, max_tokens: Optional[int] = None):
+        # Merged, de-duplicated and cut to CONTEXT_MAX_TOKENS
+        with time_stage("context"):
+            context_text = build_context(context_docs)
+        prompt = self.prompt_template.format(context=context_text, question=query)
         
         if not context_docs:
             # Fallback if no docs? Or just answer?
@@ -55,18 +54,32 @@ Answer:""",
 
         try:
             if stream:
-                return self._stream_response(query, context_text)
+                return self._stream_response(prompt, max_tokens)
             else:
-                response = await self.chain.ainvoke({"context": context_text, "question": query})
-                return response.content
+                with time_stage("generation"):
+                    return await self.backend.complete(prompt, max_tokens)
         except Exception as e:
             logger.error(f"Generation failed: {e}")
             # Fallback strategy handled by caller usually, but we can return specific signal
             raise e
 
-    async def _stream_response(self, query: str, context_text: str) -> AsyncGenerator[str, None]:
-        async for chunk in self.chain.astream({"context": context_text, "question": query}):
-            yield chunk.content
+    async def _stream_response(self, prompt: str, max_tokens: Optional[int]) -> AsyncGenerator[str, None]:
+        backend = self.backend.name
+        start = time.perf_counter()
+        first = None
+        count = 0
+        async for token in self.backend.stream(prompt, max_tokens):
+            if first is None:
+                first = time.perf_counter()
+                TIME_TO_FIRST_TOKEN.labels(backend=backend).observe(first - start)
+            count += 1
+            yield token
+        
+        end = time.perf_counter()
+        observe_stage("generation", end - start)
+        GENERATED_TOKENS.labels(backend=backend).inc(count)
+        if count > 1 and end > first:
+            STREAM_TOKENS_PER_SECOND.labels(backend=backend).observe((count - 1) / (end - first))
 
 def get_rag_engine() -> RAGEngine:
     """Get or create the RAG engine instance (lazy initialization)."""
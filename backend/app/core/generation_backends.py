@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+from typing import AsyncIterator, Callable, Dict, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationBackend:
+    """Turns a finished prompt into an answer, whole or as a token stream."""
+
+    name = "base"
+
+    async def complete(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str, max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+
+class GeminiBackend(GenerationBackend):
+    name = "gemini"
+
+    def __init__(self):
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        # One client for all requests; the output limit goes with each call
+        self.llm = ChatGoogleGenerativeAI(
+            model=settings.GENERATION_MODEL,
+            google_api_key=settings.GEMINI_API_KEY,
+            temperature=0.2,
+            convert_system_message_to_human=True
+        )
+
+    @staticmethod
+    def _limits(max_tokens: Optional[int]) -> Dict[str, dict]:
+        return {"generation_config": {"max_output_tokens": max_tokens}} if max_tokens else {}
+
+    async def complete(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        response = await self.llm.ainvoke(prompt, **self._limits(max_tokens))
+        return response.content
+
+    async def stream(self, prompt: str, max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        async for chunk in self.llm.astream(prompt, **self._limits(max_tokens)):
+            yield chunk.content
+
+
+class StubBackend(GenerationBackend):
+    """Deterministic offline stand-in for load tests and CI.
+
+    Answers with words taken from the prompt's context, so the output depends
+    only on the prompt. The first token arrives after STUB_FIRST_TOKEN_MS and
+    the rest at STUB_TOKENS_PER_SECOND, which lets the serving path be timed
+    as if a real model sat behind it.
+    """
+
+    name = "stub"
+    _WORDS = re.compile(r"\S+")
+
+    def __init__(self):
+        self.first_token_delay = settings.STUB_FIRST_TOKEN_MS / 1000
+        self.token_delay = 1 / settings.STUB_TOKENS_PER_SECOND if settings.STUB_TOKENS_PER_SECOND > 0 else 0.0
+        self.answer_tokens = settings.STUB_ANSWER_TOKENS
+
+    def _tokens(self, prompt: str, max_tokens: Optional[int]) -> list:
+        count = min(self.answer_tokens, max_tokens or self.answer_tokens)
+        context = prompt.split("Context:", 1)[-1]
+        words = self._WORDS.findall(context) or ["stub"]
+        # Start at a prompt-dependent offset so different questions read differently
+        start = int(hashlib.md5(prompt.encode()).hexdigest(), 16) % len(words)
+        return [(" " if i else "") + words[(start + i) % len(words)] for i in range(count)]
+
+    async def complete(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        tokens = self._tokens(prompt, max_tokens)
+        await asyncio.sleep(self.first_token_delay + self.token_delay * max(0, len(tokens) - 1))
+        return "".join(tokens)
+
+    async def stream(self, prompt: str, max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        for i, token in enumerate(self._tokens(prompt, max_tokens)):
+            await asyncio.sleep(self.first_token_delay if i == 0 else self.token_delay)
+            yield token
+
+
+class LlamaCppBackend(GenerationBackend):
+    """Local GGUF model through llama-cpp-python (optional: pip install llama-cpp-python)."""
+
+    name = "llama_cpp"
+
+    def __init__(self):
+        try:
+            from llama_cpp import Llama
+        except ImportError as e:
+            raise ImportError("GENERATION_BACKEND=llama_cpp needs: pip install llama-cpp-python") from e
+        if not settings.LLAMA_MODEL_PATH:
+            raise ValueError("GENERATION_BACKEND=llama_cpp needs LLAMA_MODEL_PATH")
+
+        logger.info(f"Loading llama.cpp model {settings.LLAMA_MODEL_PATH}")
+        self.model = Llama(
+            model_path=settings.LLAMA_MODEL_PATH,
+            n_ctx=settings.LLAMA_CONTEXT_SIZE,
+            n_threads=settings.LLAMA_THREADS or None,
+            verbose=False,
+        )
+        # llama.cpp contexts are not thread-safe; requests take turns
+        self._lock = threading.Lock()
+
+    def _generate(self, prompt: str, max_tokens: Optional[int], stream: bool):
+        return self.model(prompt, max_tokens=max_tokens or 512, temperature=0.2, stream=stream)
+
+    def _complete_sync(self, prompt: str, max_tokens: Optional[int]) -> str:
+        with self._lock:
+            return self._generate(prompt, max_tokens, stream=False)["choices"][0]["text"]
+
+    async def complete(self, prompt: str, max_tokens: Optional[int] = None) -> str:
+        return await asyncio.to_thread(self._complete_sync, prompt, max_tokens)
+
+    async def stream(self, prompt: str, max_tokens: Optional[int] = None) -> AsyncIterator[str]:
+        # Decode on a thread and hand tokens to the event loop through a queue
+        loop = asyncio.get_running_loop()
+        tokens: asyncio.Queue = asyncio.Queue()
+        done = object()
+        # Set when the consumer goes away (client disconnected), so the model slot is freed early
+        stop = threading.Event()
+
+        def produce():
+            try:
+                with self._lock:
+                    if stop.is_set():
+                        return
+                    chunks = self._generate(prompt, max_tokens, stream=True)
+                    try:
+                        for chunk in chunks:
+                            if stop.is_set():
+                                break
+                            loop.call_soon_threadsafe(tokens.put_nowait, chunk["choices"][0]["text"])
+                    finally:
+                        chunks.close()
+            except Exception as e:
+                loop.call_soon_threadsafe(tokens.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(tokens.put_nowait, done)
+
+        loop.run_in_executor(None, produce)
+        try:
+            while (token := await tokens.get()) is not done:
+                if isinstance(token, Exception):
+                    raise token
+                yield token
+        finally:
+            stop.set()
+
+
+_BACKENDS: Dict[str, Callable[[], GenerationBackend]] = {
+    "gemini": GeminiBackend,
+    "stub": StubBackend,
+    "llama_cpp": LlamaCppBackend,
+}
+
+
+def create_generation_backend(name: Optional[str] = None) -> GenerationBackend:
+    """Build the backend named by GENERATION_BACKEND (or `name`)."""
+    name = name or settings.GENERATION_BACKEND
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown generation backend: {name} (expected one of {', '.join(_BACKENDS)})")
+    logger.info(f"Using generation backend: {name}")
+    return _BACKENDS[name]()
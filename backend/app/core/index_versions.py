@@ -0,0 +1,104 @@
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from typing import List, Optional
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "current.json"
+LEXICAL_DIR = "bm25"  # SparseBM25 arrays, saved next to index.faiss in each version
+CHUNKS_DIR = "chunks"  # ChunkStore columns (texts and metadata by row), likewise
+_VERSION_DIR = re.compile(r"^v(\d+)$")
+# Files of the old unversioned layout, where the index lived directly in the root
+_LEGACY_FILES = ("index.faiss", "index.pkl", "manifest.json")
+
+
+class IndexVersions:
+    """Versioned index snapshots under one root directory.
+
+    Each build lives in its own `v{N}/` directory and `current.json` names the
+    live one. Publishing a version is a single atomic rename of that file, so
+    every worker watching it flips to the new build at once and no reader ever
+    sees a half-written directory.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def version_path(self, version: int) -> str:
+        return os.path.join(self.root, f"v{version}")
+
+    def versions(self) -> List[int]:
+        if not os.path.isdir(self.root):
+            return []
+        found = [_VERSION_DIR.match(name) for name in os.listdir(self.root)]
+        return sorted(int(m.group(1)) for m in found if m)
+
+    def current_version(self) -> Optional[int]:
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE), 'r') as f:
+                return int(json.load(f)["version"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _has_legacy_layout(self) -> bool:
+        return os.path.exists(os.path.join(self.root, "index.faiss"))
+
+    def current_path(self) -> Optional[str]:
+        """Directory of the live index, falling back to an unversioned legacy index."""
+        version = self.current_version()
+        if version is not None:
+            return self.version_path(version)
+        if self._has_legacy_layout():
+            return self.root
+        return None
+
+    def create_version(self) -> int:
+        """Claim the next free version directory. mkdir is atomic, so concurrent builders never share one."""
+        os.makedirs(self.root, exist_ok=True)
+        version = (max(self.versions(), default=0)) + 1
+        while True:
+            try:
+                os.mkdir(self.version_path(version))
+                return version
+            except FileExistsError:
+                version += 1
+
+    def publish(self, version: int):
+        current = os.path.join(self.root, CURRENT_FILE)
+        tmp_path = f"{current}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump({"version": version, "published_at": time.time()}, f)
+        os.replace(tmp_path, current)
+        logger.info(f"Published index version {version}")
+
+    def discard(self, version: int):
+        shutil.rmtree(self.version_path(version), ignore_errors=True)
+
+    def prune(self, keep: int):
+        """Delete all but the newest `keep` versions (never the live one) and any legacy files.
+
+        Processes still serving an older snapshot keep working: a loaded index no
+        longer needs its files, and mapped files stay valid until unmapped.
+        """
+        current = self.current_version()
+        if current is None:
+            return
+        older = [v for v in self.versions() if v < current]
+        for version in older[:max(0, len(older) - max(0, keep - 1))]:
+            self.discard(version)
+        for name in _LEGACY_FILES:
+            legacy = os.path.join(self.root, name)
+            if os.path.isfile(legacy):
+                os.remove(legacy)
+
+
+def documents_in_id_order(vector_store) -> List[Document]:
+    """Docstore documents ordered by FAISS id, the row order shared by every index in a version."""
+    docstore = vector_store.docstore
+    id_map = vector_store.index_to_docstore_id
+    return [docstore.search(id_map[i]) for i in range(vector_store.index.ntotal)]
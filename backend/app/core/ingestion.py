@@ -1,139 +1,288 @@
 import os
 import json
-import time
 import logging
-from typing import List, Dict, Any
-import pandas as pd
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
-
+import shutil
+import threading
+from functools import partial
+from typing import List, Dict, Any, Iterator, Optional
 
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain_core.documents import Document
 from app.core.config import settings
+from app.core.embeddings import get_embeddings
+from app.core.chunk_store import ChunkStore
+from app.core.index_versions import IndexVersions, CHUNKS_DIR, LEXICAL_DIR, documents_in_id_order
+from app.core.lexical import SparseBM25
+from app.core.loader import chunk_document, iter_documents
+from app.core.pipeline import IngestionPipeline
+from app.core.vector_index import build_ann_index, is_cosine, load_vector_store, normalize, save_ann_index
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MANIFEST_FILE = "manifest.json"
+
 class IngestionManager:
     def __init__(self):
-        self.embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        self.embeddings = get_embeddings()
         self.vector_store = None
         self.metadata_path = os.path.join(settings.DATA_DIR, settings.METADATA_FILE)
         self.index_path = os.path.join(settings.DATA_DIR, "faiss_index")
+        self.versions = IndexVersions(self.index_path)
+        self.last_run: Dict[str, int] = {}
+        # The pipeline's parse, chunk and index stages run on separate threads and all
+        # touch the docstore; the parse and chunk stages also share the run's manifest
+        self._store_lock = threading.Lock()
 
     def load_file(self, file_path: str) -> List[Dict[str, Any]]:
-        logger.info(f"Loading file: {file_path}")
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Split by delimiter
-        raw_docs = content.split("================================================================================")
-        processed_docs = []
-        
-        for raw_doc in raw_docs:
-            if not raw_doc.strip():
-                continue
-            
-            lines = raw_doc.strip().split('\n')
-            title = "Unknown"
-            url = "Unknown"
-            body_lines = []
-            
-            for line in lines:
-                if line.startswith("Title:"):
-                    title = line.replace("Title:", "").strip()
-                elif line.startswith("URL:"):
-                    url = line.replace("URL:", "").strip()
-                else:
-                    body_lines.append(line)
-            
-            body = "\n".join(body_lines).strip()
-            if body:
-                processed_docs.append({
-                    "title": title,
-                    "url": url,
-                    "content": body
-                })
-        
-        logger.info(f"Parsed {len(processed_docs)} documents")
-        return processed_docs
+        """All documents of a knowledge file or directory at once; ingestion streams them with iter_documents."""
+        return list(iter_documents(file_path))
 
     def chunk_documents(self, docs: List[Dict[str, Any]]) -> List[Document]:
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.CHUNK_SIZE,
-            chunk_overlap=settings.CHUNK_OVERLAP
-        )
-        
         chunked_docs = []
-        chunk_id_counter = 0
-        
         for doc in docs:
-            chunks = splitter.split_text(doc["content"])
-            for i, chunk in enumerate(chunks):
-                chunk_id = f"chunk_{chunk_id_counter}"
-                metadata = {
-                    "source_file": settings.KNOWLEDGE_FILE,
-                    "chunk_id": chunk_id,
-                    "title": doc["title"],
-                    "url": doc["url"],
-                    "start_pos": -1, # generic, hard to track exact pos after split
-                    "end_pos": -1,
-                    "original_text_snippet": chunk[:200]
-                }
-                chunked_docs.append(Document(page_content=chunk, metadata=metadata))
-                chunk_id_counter += 1
+            chunked_docs.extend(chunk_document(doc))
                 
         logger.info(f"Created {len(chunked_docs)} chunks")
         return chunked_docs
 
+    def load_manifest(self, index_path: str) -> Dict[str, Any]:
+        """Per-document content hashes and chunk IDs of what is indexed in `index_path`."""
+        manifest_path = os.path.join(index_path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return {}
+        with open(manifest_path, 'r') as f:
+            return json.load(f).get("documents", {})
+
+    def save_manifest(self, documents: Dict[str, Any], index_path: str):
+        manifest_path = os.path.join(index_path, MANIFEST_FILE)
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"documents": documents}, f)
+        os.replace(tmp_path, manifest_path)
+
+    def _new_pipeline(self, progress: Optional[Dict[str, Any]] = None, cancel_event: Optional[threading.Event] = None) -> IngestionPipeline:
+        return IngestionPipeline(
+            self.embeddings,
+            batch_size=settings.BATCH_SIZE,
+            max_batch_size=settings.MAX_BATCH_SIZE,
+            processes=settings.EMBED_PROCESSES,
+            chunk_processes=settings.CHUNK_PROCESSES,
+            progress=progress,
+            cancel_event=cancel_event,
+        )
+
+    def _index_batch(self, documents: List[Document], vectors: List[List[float]]):
+        """Add pre-embedded chunks to self.vector_store (created if needed), keyed by chunk_id."""
+        # Unit vectors, so the inner product index scores cosine similarity
+        text_embeddings = list(zip([d.page_content for d in documents], normalize(vectors).tolist()))
+        metadatas = [d.metadata for d in documents]
+        ids = [d.metadata["chunk_id"] for d in documents]
+        with self._store_lock:
+            if self.vector_store is None:
+                logger.info("Creating new FAISS index...")
+                self.vector_store = FAISS.from_embeddings(
+                    text_embeddings, self.embeddings, metadatas=metadatas, ids=ids,
+                    distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT,
+                )
+            else:
+                self.vector_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+
+    def _update_chunk_metadata(self, metadata: Dict[str, Any]) -> bool:
+        """Refresh where an already indexed chunk sits in its source file (its text and vector are unchanged).
+
+        Returns whether anything changed. Callers hold _store_lock."""
+        stored = self.vector_store.docstore._dict.get(metadata["chunk_id"])
+        location = {key: metadata[key] for key in ("source_file", "start_pos", "end_pos")}
+        if stored is None or all(stored.metadata.get(key) == value for key, value in location.items()):
+            return False
+        stored.metadata.update(location)
+        return True
+
+    def _relocate_chunks(self, entry: Dict[str, Any], doc: Dict[str, Any]) -> int:
+        """An unchanged document may have moved within or between source files; shift its chunks' offsets.
+
+        Returns the number of chunks moved. Callers hold _store_lock."""
+        shift = doc["offset"] - entry["offset"]
+        if not shift and doc["source_file"] == entry.get("source_file"):
+            return 0
+        moved = 0
+        for chunk_id in entry["chunks"]:
+            stored = self.vector_store.docstore._dict.get(chunk_id)
+            if stored is not None and stored.metadata.get("start_pos", -1) >= 0:
+                moved += self._update_chunk_metadata({
+                    "chunk_id": chunk_id,
+                    "source_file": doc["source_file"],
+                    "start_pos": stored.metadata["start_pos"] + shift,
+                    "end_pos": stored.metadata["end_pos"] + shift,
+                })
+        return moved
+
     def batch_embed_and_index(self, documents: List[Document]):
-        total_docs = len(documents)
-        batch_size = settings.BATCH_SIZE
-        
-        # Check if index exists to load it, else create new
-        if os.path.exists(self.index_path):
-             logger.info("Loading existing FAISS index...")
-             self.vector_store = FAISS.load_local(self.index_path, self.embeddings, allow_dangerous_deserialization=True)
-        else:
-             logger.info("Creating new FAISS index...")
-             # Initialize with first batch
-             first_batch = documents[:batch_size]
-             self.vector_store = FAISS.from_documents(first_batch, self.embeddings)
-             documents = documents[batch_size:]
-
-        # Process remaining in batches
-        for i in range(0, len(documents), batch_size):
-            batch = documents[i:i + batch_size]
-            logger.info(f"Embedding batch {i//batch_size + 1}/{(len(documents)//batch_size) + 1}")
-            try:
-                self.vector_store.add_documents(batch)
-                # Checkpoint every 10 batches
-                if (i // batch_size) % 10 == 0:
-                     self.vector_store.save_local(self.index_path)
-                time.sleep(1) # Rate limit buffer
-            except Exception as e:
-                logger.error(f"Error embedding batch: {e}")
-                # Continue or retry logic could go here
-        
-        # Final save
-        self.vector_store.save_local(self.index_path)
-        
-        # Save metadata separately for audit
-        meta_records = [doc.metadata for doc in documents]
-        # Append to existing if needed, but for now overwrite/new
-        df = pd.DataFrame(meta_records)
-        df.to_json(self.metadata_path, orient='records', lines=True)
-        logger.info("Ingestion complete")
+        """Embed and add already-chunked documents to self.vector_store through the pipeline."""
+        pipeline = self._new_pipeline()
+        pipeline.chunk_processes = 0  # Already chunked; nothing for worker processes to do
+        pipeline.run(documents, lambda doc: [doc], self._index_batch)
+        logger.info(f"Embedded {len(documents)} chunks")
+
+    def write_metadata(self):
+        """Rewrite the audit metadata file from everything currently in the index."""
+        with open(self.metadata_path, 'w', encoding='utf-8') as f:
+            for doc in self.vector_store.docstore._dict.values():
+                f.write(json.dumps(doc.metadata) + "\n")
+
+    def run_ingestion(
+        self,
+        file_path: str = None,
+        full_rebuild: bool = False,
+        progress: Optional[Dict[str, Any]] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> int:
+        """Build the next index version from the knowledge file and publish it.
+
+        Incremental runs start from a copy of the live version, so only new or changed
+        chunks are embedded. The live version is untouched until the new one is
+        complete; a failed or cancelled run just discards its directory. `progress` is
+        filled in as the pipeline runs and setting `cancel_event` aborts with
+        IngestionCancelled.
+
+        Returns the total number of chunks in the index; the added/removed/unchanged/
+        relocated (moved within the source files) breakdown and the new version are
+        kept in self.last_run.
+        """
+        live_path = self.versions.current_path()
+        version = self.versions.create_version()
+        version_path = self.versions.version_path(version)
+        try:
+            if not full_rebuild and live_path:
+                # Only the vectors, docstore and manifest are needed; derived indexes are rebuilt
+                for name in ("index.faiss", "index.pkl", MANIFEST_FILE):
+                    source = os.path.join(live_path, name)
+                    if os.path.isfile(source):
+                        shutil.copy2(source, version_path)
+            count = self.ingest_into(version_path, file_path, full_rebuild, progress, cancel_event)
+        except BaseException:
+            self.versions.discard(version)
+            raise
 
-    def run_ingestion(self, file_path: str = None):
+        unchanged = live_path and not full_rebuild and not any(self.last_run[k] for k in ("added", "removed", "relocated"))
+        if unchanged or not os.path.exists(os.path.join(version_path, "index.faiss")):
+            # Nothing changed (or nothing to index); keep serving the live version
+            self.versions.discard(version)
+            return count
+        self.versions.publish(version)
+        self.versions.prune(settings.INDEX_KEEP_VERSIONS)
+        self.last_run["version"] = version
+        return count
+
+    def ingest_into(
+        self,
+        index_path: str,
+        file_path: str = None,
+        full_rebuild: bool = False,
+        progress: Optional[Dict[str, Any]] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> int:
+        """Bring the index in `index_path` in line with the knowledge file(s), embedding only new or changed chunks."""
         if not file_path:
             file_path = os.path.join(settings.DATA_DIR, settings.KNOWLEDGE_FILE)
+        if progress is None:
+            progress = {}
             
-        docs = self.load_file(file_path)
-        chunks = self.chunk_documents(docs)
-        self.batch_embed_and_index(chunks)
-        return len(chunks)
+        previous = {} if full_rebuild else self.load_manifest(index_path)
+        if previous and os.path.exists(os.path.join(index_path, "index.faiss")):
+            logger.info("Loading existing FAISS index...")
+            self.vector_store = load_vector_store(index_path, self.embeddings)
+            if not is_cosine(self.vector_store.index):
+                # Built with L2 distances before cosine similarity; its vectors are not normalized
+                logger.info("Existing index uses L2 distance, re-embedding everything for cosine similarity")
+                previous = {}
+                self.vector_store = None
+        else:
+            # No manifest means we cannot trust the IDs in any existing index
+            previous = {}
+            self.vector_store = None
+
+        indexed_ids = {cid for entry in previous.values() for cid in entry["chunks"]}
+        manifest = {}
+        docs_seen = 0
+        changed_docs = 0
+        relocated = 0
+
+        def manifest_entry(doc: Dict[str, Any], chunk_ids: List[str]) -> Dict[str, Any]:
+            return {"hash": doc["content_hash"], "chunks": chunk_ids, "source_file": doc["source_file"], "offset": doc["offset"]}
+
+        def docs_to_chunk() -> Iterator[Dict[str, Any]]:
+            # Runs on the pipeline's parse stage: unchanged documents never reach the chunkers
+            nonlocal docs_seen, relocated
+            for doc in iter_documents(file_path, progress):
+                docs_seen += 1
+                entry = previous.get(doc["doc_key"])
+                if entry and entry["hash"] == doc["content_hash"] and "offset" in entry:
+                    with self._store_lock:
+                        relocated += self._relocate_chunks(entry, doc)
+                        manifest[doc["doc_key"]] = manifest_entry(doc, entry["chunks"])
+                else:
+                    # Changed, or indexed before byte offsets were recorded (re-split, but not re-embedded)
+                    yield doc
+
+        def select_new(doc: Dict[str, Any], chunks: List[Document]) -> List[Document]:
+            # Runs on the pipeline's chunk stage: record the document and keep chunks not indexed yet
+            nonlocal changed_docs, relocated
+            entry = previous.get(doc["doc_key"])
+            if not entry or entry["hash"] != doc["content_hash"]:
+                changed_docs += 1
+            new_chunks = []
+            with self._store_lock:
+                manifest[doc["doc_key"]] = manifest_entry(doc, [c.metadata["chunk_id"] for c in chunks])
+                for chunk in chunks:
+                    if chunk.metadata["chunk_id"] in indexed_ids:
+                        relocated += self._update_chunk_metadata(chunk.metadata)
+                    else:
+                        new_chunks.append(chunk)
+            return new_chunks
+
+        split = partial(chunk_document, chunk_size=settings.CHUNK_SIZE, chunk_overlap=settings.CHUNK_OVERLAP)
+        self._new_pipeline(progress, cancel_event).run(docs_to_chunk(), split, self._index_batch, select_new)
+        progress["docs_total"] = docs_seen
+
+        wanted_ids = {cid for entry in manifest.values() for cid in entry["chunks"]}
+        to_delete = list(indexed_ids - wanted_ids)
+        added = progress["chunks_indexed"]
+
+        logger.info(
+            f"{changed_docs}/{docs_seen} documents changed: {added} chunks embedded, {len(to_delete)} to remove, "
+            f"{relocated} moved in their source files"
+        )
+        if to_delete:
+            self.vector_store.delete(to_delete)
+
+        # An incremental run that changed nothing leaves the index as it was; run_ingestion then
+        # discards the version, so building the derived indexes would be wasted work
+        unchanged = bool(previous) and not (added or to_delete or relocated)
+        if self.vector_store is not None and not unchanged:
+            self.vector_store.save_local(index_path)
+            # Lexical index and chunk store built once here, in the same row order as FAISS
+            documents = documents_in_id_order(self.vector_store)
+            SparseBM25.build(doc.page_content for doc in documents).save(os.path.join(index_path, LEXICAL_DIR))
+            ChunkStore.build(documents).save(os.path.join(index_path, CHUNKS_DIR))
+            # HNSW/IVF index for VECTOR_INDEX_TYPE, rebuilt from the exact one in the same row order
+            ann_index = build_ann_index(self.vector_store.index)
+            if ann_index is not None:
+                save_ann_index(ann_index, index_path)
+            self.save_manifest(manifest, index_path)
+            self.write_metadata()
+        logger.info("Ingestion complete")
+
+        self.last_run = {
+            "added": added,
+            "removed": len(to_delete),
+            "unchanged": len(wanted_ids) - added,
+            "relocated": relocated,
+        }
+        return len(wanted_ids)
+
 
 ingestion_manager = IngestionManager()
@@ -0,0 +1,280 @@
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+from app.core.config import settings
+from app.core.metrics import INGEST_CHUNKS, INGEST_JOBS, INGEST_PROGRESS, INGEST_RUNNING, registry
+from app.core.pipeline import IngestionCancelled
+
+logger = logging.getLogger(__name__)
+
+MAX_FINISHED_JOBS = 50
+# Under the index root, shared by every worker process on the node
+JOBS_DIR = "jobs"  # {job_id}.json state, plus {job_id}.cancel requests
+LOCK_FILE = "ingest.lock"  # flock'd by the process (API worker or ingest.py) running an ingestion
+SYNC_INTERVAL = 1.0  # Seconds between state writes and cancel checks of a running job
+_JOB_ID = re.compile(r"^[0-9a-f]{12}$")
+
+
+@contextmanager
+def ingestion_lock(cancelled: Callable[[], bool] = lambda: False) -> Iterator[bool]:
+    """Hold the node-wide ingestion lock, waiting for an ingestion running in another process.
+
+    Yields False, without the lock, if `cancelled()` turns true while waiting.
+    """
+    root = os.path.join(settings.DATA_DIR, "faiss_index")
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, LOCK_FILE)
+    # The lock is released when the file closes, even if this process dies
+    with open(path, 'a') as lock:
+        acquired = waiting = False
+        while not cancelled():
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                acquired = True
+                break
+            except BlockingIOError:
+                if not waiting:
+                    logger.info(f"Another ingestion holds {path}, waiting")
+                    waiting = True
+                time.sleep(SYNC_INTERVAL)
+        yield acquired
+
+
+class IngestionJob:
+    """One background ingestion run and its live progress."""
+
+    def __init__(self, full_rebuild: bool):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = "reindex" if full_rebuild else "ingest"
+        self.full_rebuild = full_rebuild
+        self.status = "queued"  # queued -> running -> succeeded | failed | cancelled
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.progress: Dict[str, Any] = {}
+        self.result: Dict[str, int] = {}
+        self.error: Optional[str] = None
+        self.cancel_event = threading.Event()
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'IngestionJob':
+        """A job as saved by the worker running it (possibly another process)."""
+        job = cls(data["kind"] == "reindex")
+        job.id = data["job_id"]
+        job.status = data["status"]
+        job.created_at = data["created_at"]
+        job.started_at = data["started_at"]
+        job.finished_at = data["finished_at"]
+        job.progress = data["progress"]
+        job.result = data["result"]
+        job.error = data["error"]
+        return job
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def eta_seconds(self) -> Optional[float]:
+        """Linear estimate from the share of the source files read so far."""
+        total = self.progress.get("bytes_total")
+        done = self.progress.get("bytes_read", 0)
+        if self.status != "running" or not total or not done:
+            return None
+        elapsed = time.time() - self.started_at
+        return elapsed * (total - done) / done
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": dict(self.progress),
+            "eta_seconds": self.eta_seconds(),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """Runs ingestion jobs one at a time on a background worker.
+
+    Each job builds a new index version next to the live one; only a finished
+    build is published and loaded into the retriever, so serving never sees a
+    half-built index.
+
+    With several uvicorn workers, a job runs in the worker that accepted it, but
+    its state is saved under the index root so any worker can report or cancel
+    it, and a lock file keeps ingestions from different workers (and ingest.py)
+    one at a time.
+    """
+
+    _instance: Optional['JobManager'] = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self._initialized = True
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-job")
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.root = os.path.join(settings.DATA_DIR, "faiss_index")
+        self.jobs_dir = os.path.join(self.root, JOBS_DIR)
+        registry.add_collector(self._collect_metrics)
+
+    def submit(self, full_rebuild: bool = False) -> IngestionJob:
+        job = IngestionJob(full_rebuild)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._save(job)
+        self._executor.submit(self._run, job)
+        logger.info(f"Queued {job.kind} job {job.id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        """A job of this worker, or the last state saved by the worker running it."""
+        return self._jobs.get(job_id) or self._load(job_id)
+
+    def cancel(self, job_id: str) -> Optional[IngestionJob]:
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = self._load(job_id)
+            if job is not None and not job.finished:
+                # Another worker's job: it picks the request up within SYNC_INTERVAL
+                open(self._path(job_id, ".cancel"), 'w').close()
+            return job
+        if job.status == "queued":
+            job.status = "cancelled"
+            job.finished_at = time.time()
+            self._save(job)
+        job.cancel_event.set()
+        return job
+
+    def _path(self, job_id: str, suffix: str = ".json") -> str:
+        return os.path.join(self.jobs_dir, job_id + suffix)
+
+    def _save(self, job: IngestionJob):
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        path = self._path(job.id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(job.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    def _load(self, job_id: str) -> Optional[IngestionJob]:
+        if not _JOB_ID.match(job_id):
+            return None
+        try:
+            with open(self._path(job_id), 'r') as f:
+                return IngestionJob.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _cancel_requested(self, job: IngestionJob) -> bool:
+        if os.path.exists(self._path(job.id, ".cancel")):
+            job.cancel_event.set()
+        return job.cancel_event.is_set()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+            for suffix in (".json", ".cancel"):
+                try:
+                    os.remove(self._path(job_id, suffix))
+                except OSError:
+                    pass
+
+    def _collect_metrics(self):
+        # Progress of the running job, or of the last one to have started
+        started = [job for job in list(self._jobs.values()) if job.started_at is not None]
+        INGEST_RUNNING.set(1 if started and started[-1].status == "running" else 0)
+        INGEST_PROGRESS.clear()
+        if started:
+            for counter, value in dict(started[-1].progress).items():
+                if isinstance(value, (int, float)):
+                    INGEST_PROGRESS.labels(counter=counter).set(value)
+
+    def _run(self, job: IngestionJob):
+        with ingestion_lock(lambda: self._cancel_requested(job)) as acquired:
+            if not acquired:
+                job.status = "cancelled"
+                job.finished_at = job.finished_at or time.time()
+                self._save(job)
+                INGEST_JOBS.labels(kind=job.kind, status=job.status).inc()
+                return
+            self._run_locked(job)
+
+    def _run_locked(self, job: IngestionJob):
+        # Imported here so the job API does not pull in the models at import time
+        from app.core.ingestion import ingestion_manager
+        from app.core.retrieval import retriever
+        from app.core.executor import get_retrieval_executor
+
+        job.status = "running"
+        job.started_at = time.time()
+        self._save(job)
+        stopped = threading.Event()
+
+        def sync():
+            # Publish progress to the other workers and pick up their cancel requests
+            while not stopped.wait(SYNC_INTERVAL):
+                self._save(job)
+                self._cancel_requested(job)
+
+        syncer = threading.Thread(target=sync, name=f"ingest-job-{job.id}-sync", daemon=True)
+        syncer.start()
+        try:
+            count = ingestion_manager.run_ingestion(
+                full_rebuild=job.full_rebuild,
+                progress=job.progress,
+                cancel_event=job.cancel_event,
+            )
+            # Pick the new version up right away rather than waiting for the watcher
+            retriever.load_index()
+            get_retrieval_executor().reload()
+            job.result = {"total_chunks": count, **ingestion_manager.last_run}
+            job.status = "succeeded"
+            INGEST_CHUNKS.inc(ingestion_manager.last_run.get("added", 0))
+            logger.info(f"Job {job.id} finished: {job.result}")
+        except IngestionCancelled:
+            job.status = "cancelled"
+            logger.info(f"Job {job.id} cancelled")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.error(f"Job {job.id} failed: {e}")
+        finally:
+            job.finished_at = time.time()
+            stopped.set()
+            syncer.join()
+            self._save(job)
+            try:
+                os.remove(self._path(job.id, ".cancel"))
+            except OSError:
+                pass
+            INGEST_JOBS.labels(kind=job.kind, status=job.status).inc()
+
+
+def get_job_manager() -> JobManager:
+    """Get or create the ingestion job manager instance."""
+    return JobManager()
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+")
+_META_FILE = "meta.json"
+_ARRAYS = ("data", "indices", "indptr", "term_hashes")
+_VOCABULARY = "blake2b-64"  # How term_hashes.npy was made; indexes saved before it are rebuilt
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens, shared by indexing and querying."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class SparseBM25:
+    """Okapi BM25 over the whole corpus as a precomputed CSR term-document matrix.
+
+    Row t holds the final BM25 weight of term t in every document containing it, so
+    scoring a query is a row slice plus one sparse mat-vec instead of a Python loop
+    over documents. Built once at ingestion and saved as .npy arrays that load()
+    memory-maps, so every worker shares the same pages. That includes the
+    vocabulary: `term_hashes` holds a 64-bit hash of each term, sorted, and row t
+    belongs to term_hashes[t], so query terms are found with np.searchsorted.
+    """
+
+    def __init__(self, term_hashes: np.ndarray, matrix: csr_matrix, k1: float = 1.5, b: float = 0.75):
+        self.term_hashes = term_hashes
+        self.matrix = matrix
+        self.k1 = k1
+        self.b = b
+
+    @property
+    def num_docs(self) -> int:
+        return self.matrix.shape[1]
+
+    @classmethod
+    def build(cls, corpus: Iterable[str], k1: float = 1.5, b: float = 0.75) -> 'SparseBM25':
+        vocabulary: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        term_freqs: List[int] = []
+        doc_lens: List[int] = []
+
+        for doc_id, text in enumerate(corpus):
+            counts = Counter(tokenize(text))
+            doc_lens.append(sum(counts.values()))
+            for term, tf in counts.items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(doc_id)
+                term_freqs.append(tf)
+
+        num_docs = len(doc_lens)
+        term_ids_arr = np.asarray(term_ids, dtype=np.int64)
+        doc_ids_arr = np.asarray(doc_ids, dtype=np.int64)
+        tf = np.asarray(term_freqs, dtype=np.float32)
+        lengths = np.asarray(doc_lens, dtype=np.float32)
+        avgdl = float(lengths.mean()) if num_docs and lengths.mean() > 0 else 1.0
+
+        # Lucene-style idf: always positive, unlike raw Okapi for very common terms
+        df = np.bincount(term_ids_arr, minlength=len(vocabulary)).astype(np.float32)
+        idf = np.log1p((num_docs - df + 0.5) / (df + 0.5))
+        norm = k1 * (1 - b + b * lengths[doc_ids_arr] / avgdl)
+        weights = idf[term_ids_arr] * tf * (k1 + 1) / (tf + norm)
+
+        # Rows in hash order, so a term's position in term_hashes is its row
+        hashes = np.fromiter((term_hash(t) for t in vocabulary), dtype=np.uint64, count=len(vocabulary))
+        order = np.argsort(hashes, kind="stable")
+        rows = np.empty(len(vocabulary), dtype=np.int64)
+        rows[order] = np.arange(len(vocabulary))
+        term_hashes = hashes[order]
+        if len(term_hashes) > 1 and (term_hashes[1:] == term_hashes[:-1]).any():
+            logger.warning("BM25 term hash collision; the colliding terms share a lookup")
+
+        matrix = csr_matrix(
+            (weights.astype(np.float32), (rows[term_ids_arr], doc_ids_arr)),
+            shape=(len(vocabulary), num_docs),
+            dtype=np.float32,
+        )
+        logger.info(f"Built BM25 matrix: {len(vocabulary)} terms x {num_docs} docs, {matrix.nnz} postings")
+        return cls(term_hashes, matrix, k1, b)
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        arrays = {
+            "data": self.matrix.data,
+            "indices": self.matrix.indices,
+            "indptr": self.matrix.indptr,
+            "term_hashes": self.term_hashes,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(array))
+        with open(os.path.join(directory, _META_FILE), 'w') as f:
+            json.dump({"shape": list(self.matrix.shape), "k1": self.k1, "b": self.b, "vocabulary": _VOCABULARY}, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'SparseBM25':
+        """Open a saved index. With mmap the arrays stay in the OS page cache rather than the heap."""
+        with open(os.path.join(directory, _META_FILE), 'r') as f:
+            meta = json.load(f)
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode) for name in _ARRAYS}
+        # Saved with scipy's own dtypes, so copy=False really keeps the mapped buffers
+        matrix = csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]), shape=tuple(meta["shape"]), copy=False)
+        return cls(arrays["term_hashes"], matrix, meta["k1"], meta["b"])
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        """A loadable index; ones saved with a JSON vocabulary are not, and get rebuilt."""
+        try:
+            with open(os.path.join(directory, _META_FILE), 'r') as f:
+                return json.load(f).get("vocabulary") == _VOCABULARY
+        except (OSError, ValueError):
+            return False
+
+    def term_rows(self, terms: List[str]) -> np.ndarray:
+        """Matrix row of each term, or -1 for terms not in the corpus."""
+        hashes = np.fromiter((term_hash(t) for t in terms), dtype=np.uint64, count=len(terms))
+        if not len(self.term_hashes):
+            return np.full(len(terms), -1, dtype=np.int64)
+        rows = np.searchsorted(self.term_hashes, hashes)
+        found = self.term_hashes[np.minimum(rows, len(self.term_hashes) - 1)] == hashes
+        return np.where(found, rows, -1)
+
+    def get_scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for the query (float32, length num_docs)."""
+        counts = Counter(tokenize(query))
+        rows = self.term_rows(list(counts))
+        known = rows >= 0
+        if not known.any():
+            return np.zeros(self.num_docs, dtype=np.float32)
+        query_weights = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))[known]
+        # (|q| x N)^T . (|q|,) -> (N,); repeated query terms count multiple times, as in BM25Okapi
+        return np.asarray(self.matrix[rows[known]].T.dot(query_weights), dtype=np.float32).ravel()
+
+    def get_scores_batch(self, queries: List[str]) -> csr_matrix:
+        """BM25 scores of many queries at once, as a sparse (queries x documents) matrix.
+
+        One sparse mat-mat product instead of a mat-vec per query; only documents
+        sharing a term with a query get an entry in its row.
+        """
+        query_ids: List[int] = []
+        terms: List[str] = []
+        weights: List[float] = []
+        for i, query in enumerate(queries):
+            for term, count in Counter(tokenize(query)).items():
+                query_ids.append(i)
+                terms.append(term)
+                weights.append(count)
+        # One lookup for the terms of every query
+        term_rows = self.term_rows(terms)
+        known = term_rows >= 0
+        query_matrix = csr_matrix(
+            (np.asarray(weights, dtype=np.float32)[known], (np.asarray(query_ids, dtype=np.int64)[known], term_rows[known])),
+            shape=(len(queries), self.matrix.shape[0]),
+            dtype=np.float32,
+        )
+        # (Q x V) . (V x N) -> (Q x N)
+        return (query_matrix @ self.matrix).tocsr()
+
+    @staticmethod
+    def top_n(scores: np.ndarray, n: int) -> List[Tuple[int, float]]:
+        """(doc index, score) of the n best documents with a positive score, best first."""
+        n = min(n, int(np.count_nonzero(scores > 0)))
+        if n <= 0:
+            return []
+        candidates = np.argpartition(-scores, n - 1)[:n]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(int(i), float(scores[i])) for i in candidates]
@@ -0,0 +1,214 @@
+import fnmatch
+import hashlib
+import logging
+import mmap
+import os
+import threading
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DELIMITER = "=" * 80  # Line between documents in a knowledge file
+_DELIMITER_BYTES = DELIMITER.encode("ascii")
+
+
+def _sha1(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _unique_key(key: str, seen: set, sep: str = "#") -> str:
+    """Suffix repeated keys (key, key#2, ...) so they stay distinct but deterministic."""
+    unique, n = key, 1
+    while unique in seen:
+        n += 1
+        unique = f"{key}{sep}{n}"
+    seen.add(unique)
+    return unique
+
+
+def source_files(path: str) -> List[str]:
+    """`path` itself, or every KNOWLEDGE_GLOB file under it in name order (which keeps doc_key suffixes stable)."""
+    if os.path.isfile(path):
+        return [path]
+    found = []
+    for root, dirs, names in os.walk(path):
+        dirs.sort()
+        found.extend(os.path.join(root, name) for name in sorted(names) if fnmatch.fnmatch(name, settings.KNOWLEDGE_GLOB))
+    return found
+
+
+def source_name(file_path: str) -> str:
+    """How chunks refer to their file: relative to DATA_DIR when inside it, else absolute."""
+    path = os.path.abspath(file_path)
+    data_dir = os.path.abspath(settings.DATA_DIR)
+    if os.path.commonpath([path, data_dir]) == data_dir:
+        return os.path.relpath(path, data_dir)
+    return path
+
+
+def source_path(name: str) -> str:
+    return name if os.path.isabs(name) else os.path.join(settings.DATA_DIR, name)
+
+
+def _parse_block(lines: List[Tuple[int, bytes]], source: str, seen_keys: Set[str]) -> Optional[Dict[str, Any]]:
+    """One document from its (byte offset, line) pairs: Title:/URL: header lines, then the body."""
+    title = "Unknown"
+    url = "Unknown"
+    body_start = None
+    for i, (_, line) in enumerate(lines):
+        text = line.decode("utf-8")
+        if text.startswith("Title:"):
+            title = text.replace("Title:", "").strip()
+        elif text.startswith("URL:"):
+            url = text.replace("URL:", "").strip()
+        elif text.strip():
+            body_start = i
+            break
+    if body_start is None:
+        return None
+
+    # The body is one contiguous run of the file, so chunks can point back into it
+    text = b"".join(line for _, line in lines[body_start:]).decode("utf-8")
+    content = text.strip()
+    if not content:
+        return None
+    leading = len(text) - len(text.lstrip())
+    doc_key = _unique_key(url if url != "Unknown" else title, seen_keys)
+    return {
+        "doc_key": doc_key,
+        "title": title,
+        "url": url,
+        "content": content,
+        "content_hash": _sha1(f"{title}\n{url}\n{content}"),
+        "source_file": source,
+        "offset": lines[body_start][0] + len(text[:leading].encode("utf-8")),
+    }
+
+
+def iter_documents(path: str, progress: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """Stream the documents of a knowledge file, or of every file in a directory.
+
+    Files are read line by line, so only the current document is held in memory
+    however large the corpus is. Each document carries its source file and the
+    byte offset of its content there. `progress`, if given, gets bytes_total and
+    bytes_read.
+    """
+    files = source_files(path)
+    if progress is not None:
+        progress["bytes_total"] = sum(os.path.getsize(f) for f in files)
+        progress["bytes_read"] = 0
+    seen_keys: Set[str] = set()
+    count = 0
+    for file_path in files:
+        logger.info(f"Loading file: {file_path}")
+        source = source_name(file_path)
+        block: List[Tuple[int, bytes]] = []
+        offset = 0
+        with open(file_path, 'rb') as f:
+            for line in f:
+                if line.strip() == _DELIMITER_BYTES:
+                    doc = _parse_block(block, source, seen_keys)
+                    if doc:
+                        count += 1
+                        yield doc
+                    block = []
+                else:
+                    block.append((offset, line))
+                offset += len(line)
+                if progress is not None:
+                    progress["bytes_read"] += len(line)
+        doc = _parse_block(block, source, seen_keys)
+        if doc:
+            count += 1
+            yield doc
+    logger.info(f"Parsed {count} documents from {len(files)} file(s)")
+
+
+@lru_cache(maxsize=4)
+def _splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def chunk_document(doc: Dict[str, Any], chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None) -> List[Document]:
+    """Split one document into chunks with stable IDs and byte offsets into its source file.
+
+    Module-level and stateless, so the ingestion pipeline can run it on worker processes.
+    """
+    chunk_size = chunk_size or settings.CHUNK_SIZE
+    chunk_overlap = settings.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+    content = doc["content"]
+    # Chunk IDs derive from the document key and chunk text, so they stay
+    # stable across runs and unchanged chunks are never re-embedded
+    doc_prefix = f"chunk_{_sha1(doc['doc_key'])[:10]}"
+    seen_ids = set()
+    chunked_docs = []
+    char_pos, byte_pos = 0, doc["offset"]
+    for chunk in _splitter(chunk_size, chunk_overlap).split_text(content):
+        chunk_hash = _sha1(f"{doc['title']}\n{doc['url']}\n{chunk}")
+        chunk_id = _unique_key(f"{doc_prefix}_{chunk_hash[:10]}", seen_ids, sep="_")
+        # Chunks are substrings of the content, in order (overlapping by up to chunk_overlap)
+        start = content.find(chunk, char_pos + 1 if chunked_docs else 0)
+        if start == -1:
+            start_pos = end_pos = -1
+        else:
+            byte_pos += len(content[char_pos:start].encode("utf-8"))
+            char_pos = start
+            start_pos, end_pos = byte_pos, byte_pos + len(chunk.encode("utf-8"))
+        metadata = {
+            "source_file": doc["source_file"],
+            "chunk_id": chunk_id,
+            "doc_key": doc["doc_key"],
+            "title": doc["title"],
+            "url": doc["url"],
+            "start_pos": start_pos,  # Byte offsets into source_file
+            "end_pos": end_pos,
+        }
+        chunked_docs.append(Document(page_content=chunk, metadata=metadata))
+    return chunked_docs
+
+
+# Read-only maps of source files, shared by all requests; remapped when a file changes
+_mapped_sources: Dict[str, Tuple[Tuple[int, int], mmap.mmap]] = {}
+_mapped_lock = threading.Lock()
+
+
+def _mapped(path: str) -> Optional[mmap.mmap]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _mapped_lock:
+        cached = _mapped_sources.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        if not stat.st_size:
+            return None
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _mapped_sources[path] = (key, mapped)
+        return mapped
+
+
+def source_context(source_file: str, start: int, end: int, context: int = 0) -> Optional[Dict[str, str]]:
+    """Bytes [start, end) of a source file, plus up to `context` bytes either side, sliced from its mmap.
+
+    None if the file is gone or too short. Callers compare "text" with the chunk
+    to tell whether the file was edited since it was indexed.
+    """
+    mapped = _mapped(source_path(source_file))
+    if mapped is None or start < 0 or end > len(mapped):
+        return None
+    lo, hi = max(0, start - context), min(len(mapped), end + context)
+    return {
+        # The context edges may cut a multi-byte character
+        "before": mapped[lo:start].decode("utf-8", errors="ignore"),
+        "text": mapped[start:end].decode("utf-8", errors="replace"),
+        "after": mapped[end:hi].decode("utf-8", errors="ignore"),
+    }
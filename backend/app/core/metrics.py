@@ -0,0 +1,172 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    disable_created_metrics,
+    generate_latest,
+    multiprocess,
+)
+
+# Latency buckets in seconds, from a cached lookup up to a slow generation
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Gauges describe one worker; in multiprocess mode each live worker's value is kept, labelled by pid
+PER_WORKER = "liveall"
+
+# Counters expose only <name>_total, not an extra <name>_created series
+disable_created_metrics()
+
+
+class MetricsRegistry:
+    """Renders the metrics below in the Prometheus text exposition format.
+
+    With PROMETHEUS_MULTIPROC_DIR set (an empty directory shared by the uvicorn
+    workers, set before they start), every worker writes its values there and
+    a scrape of any worker returns counters and histograms summed over all of
+    them. Without it, values are per worker process.
+    """
+
+    content_type = CONTENT_TYPE_LATEST
+
+    def __init__(self):
+        self._collectors: List[Callable[[], None]] = []
+
+    @property
+    def multiprocess(self) -> bool:
+        return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Called before each render, to refresh gauges that are cheaper to read than to track."""
+        self._collectors.append(collector)
+
+    def render(self) -> bytes:
+        for collector in self._collectors:
+            collector()
+        if self.multiprocess:
+            merged = CollectorRegistry()
+            multiprocess.MultiProcessCollector(merged)
+            return generate_latest(merged)
+        return generate_latest(REGISTRY)
+
+    def worker_exit(self):
+        """Drop this worker's live gauges from the multiprocess directory."""
+        if self.multiprocess:
+            multiprocess.mark_process_dead(os.getpid())
+
+
+registry = MetricsRegistry()
+
+# /query
+QUERY_SECONDS = Histogram(
+    "rag_query_seconds", "End-to-end /query latency (to the last byte for streams)", ["mode", "result"],
+    buckets=DEFAULT_BUCKETS,
+)
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Duration of each /query stage", ["stage"], buckets=DEFAULT_BUCKETS)
+
+# Generation
+TIME_TO_FIRST_TOKEN = Histogram(
+    "rag_time_to_first_token_seconds", "Time from starting a streamed generation to its first token", ["backend"],
+    buckets=DEFAULT_BUCKETS,
+)
+STREAM_TOKENS_PER_SECOND = Histogram(
+    "rag_stream_tokens_per_second", "Decode rate of streamed answers after the first token", ["backend"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+GENERATED_TOKENS = Counter("rag_generated_tokens", "Streamed answer tokens", ["backend"])
+
+# Cache
+CACHE_LOOKUPS = Counter("rag_cache_lookups", "Cache lookups by layer and outcome", ["layer", "outcome"])
+CACHE_HIT_RATIO = Gauge(
+    "rag_cache_hit_ratio", "Share of lookups served from L1, L2 or the semantic index", ["layer"],
+    multiprocess_mode=PER_WORKER,
+)
+
+# Index
+INDEX_CHUNKS = Gauge("rag_index_chunks", "Chunks in the live index", multiprocess_mode=PER_WORKER)
+INDEX_BYTES = Gauge("rag_index_bytes", "On-disk size of the live index version", multiprocess_mode=PER_WORKER)
+INDEX_VERSION = Gauge("rag_index_version", "Live index version", multiprocess_mode=PER_WORKER)
+INDEX_LOAD_SECONDS = Gauge("rag_index_load_seconds", "Time the last index load took", multiprocess_mode=PER_WORKER)
+INDEX_LOADS = Counter("rag_index_loads", "Index loads by outcome", ["outcome"])
+PROCESS_MEMORY = Gauge(
+    "rag_process_resident_bytes", "Resident memory of this worker: private heap (anon) vs mapped files (file)", ["kind"],
+    multiprocess_mode=PER_WORKER,
+)
+
+# Ingestion
+INGEST_JOBS = Counter("rag_ingestion_jobs", "Finished ingestion jobs", ["kind", "status"])
+INGEST_CHUNKS = Counter("rag_ingestion_chunks", "Chunks embedded and indexed by ingestion jobs")
+INGEST_RUNNING = Gauge("rag_ingestion_running", "1 while an ingestion job is running", multiprocess_mode=PER_WORKER)
+INGEST_PROGRESS = Gauge(
+    "rag_ingestion_progress", "Progress counters of the current (or last) ingestion job", ["counter"],
+    multiprocess_mode=PER_WORKER,
+)
+
+
+def _collect_hit_ratio():
+    lookups: Dict[str, List[float]] = {}
+    for sample in CACHE_LOOKUPS.collect()[0].samples:
+        counts = lookups.setdefault(sample.labels["layer"], [0.0, 0.0])
+        counts[1] += sample.value
+        if sample.labels["outcome"] != "misses":
+            counts[0] += sample.value
+    for layer, (hits, total) in lookups.items():
+        CACHE_HIT_RATIO.labels(layer=layer).set(hits / total if total else 0.0)
+
+
+def _collect_memory():
+    # Linux only; memory-mapped indexes show up under "file", shared with the other workers
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(("RssAnon:", "RssFile:")):
+                    PROCESS_MEMORY.labels(kind=line[3:7].lower()).set(int(line.split()[1]) * 1024)
+    except OSError:
+        pass
+
+
+registry.add_collector(_collect_hit_ratio)
+registry.add_collector(_collect_memory)
+
+
+# Per-request stage breakdown, for the Server-Timing header
+_request_timer: ContextVar[Optional["RequestTimer"]] = ContextVar("rag_request_timer", default=None)
+
+
+class RequestTimer:
+    """Stage durations (ms) of the current request; observe_stage() also lands here."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        _request_timer.set(self)
+
+    def finish(self, mode: str, result: str):
+        elapsed = time.perf_counter() - self.start
+        self.stages["total"] = elapsed * 1000
+        QUERY_SECONDS.labels(mode=mode, result=result).observe(elapsed)
+
+    def header(self) -> str:
+        return ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in self.stages.items())
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage=stage).observe(seconds)
+    timer = _request_timer.get()
+    if timer is not None:
+        timer.stages[stage] = timer.stages.get(stage, 0.0) + seconds * 1000
+
+
+@contextmanager
+def time_stage(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
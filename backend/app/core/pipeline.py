@@ -0,0 +1,263 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from langchain_core.documents import Document
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()  # End-of-stream marker passed between stages
+
+
+class IngestionCancelled(Exception):
+    """Raised by IngestionPipeline.run when its cancel event is set."""
+
+
+class AdaptiveBatchSize:
+    """Hill-climbs the embedding batch size on observed chunks/s.
+
+    Doubles while throughput keeps improving, halves (and stops growing) once a
+    larger batch is clearly slower per chunk.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.size = max(minimum, min(initial, maximum))
+        self._best = 0.0
+        self._growing = True
+        self._lock = threading.Lock()
+
+    def record(self, batch_size: int, seconds: float):
+        if seconds <= 0 or batch_size < self.size:
+            # Partial (tail) batches say nothing about the current size
+            return
+        throughput = batch_size / seconds
+        with self._lock:
+            if throughput >= self._best * 1.05:
+                self._best = throughput
+                if self._growing and self.size < self.maximum:
+                    self.size = min(self.maximum, self.size * 2)
+            elif throughput < self._best * 0.8:
+                self._growing = False
+                self.size = max(self.minimum, self.size // 2)
+                self._best = throughput
+
+
+# Process-pool embedding: each worker loads its own copy of the model once
+_worker_embeddings = None
+
+
+def _init_embed_worker(model_name: str, backend: str):
+    global _worker_embeddings
+    from app.core.embeddings import get_embeddings
+    _worker_embeddings = get_embeddings(model_name, backend)
+
+
+def _embed_in_worker(texts: List[str]) -> Tuple[List[List[float]], float]:
+    start = time.perf_counter()
+    vectors = _worker_embeddings.embed_documents(texts)
+    return vectors, time.perf_counter() - start
+
+
+class IngestionPipeline:
+    """Parse -> chunk -> embed -> index stages joined by bounded queues.
+
+    Each stage runs on its own thread so parsing and chunking overlap with
+    embedding, and indexing overlaps with the next embedding batch. Embedding
+    runs on one background thread, or on `processes` worker processes; chunking
+    likewise on `chunk_processes`.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        batch_size: int = 64,
+        max_batch_size: int = 512,
+        processes: int = 0,
+        chunk_processes: int = 0,
+        queue_size: int = 1024,
+        progress: Optional[Dict[str, Any]] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ):
+        self.embeddings = embeddings
+        self.batch_size = AdaptiveBatchSize(batch_size, minimum=min(8, batch_size), maximum=max_batch_size)
+        self.processes = processes
+        self.chunk_processes = chunk_processes
+        self.queue_size = queue_size
+        # Callers may pass their own dict to watch progress while run() is going
+        self.progress = progress if progress is not None else {}
+        for key in ("docs_parsed", "docs_chunked", "chunks_created", "chunks_embedded", "chunks_indexed"):
+            self.progress[key] = 0
+        self.cancel_event = cancel_event
+        self._error: Optional[BaseException] = None
+
+    def _ok(self) -> bool:
+        """False once any stage failed or the run was cancelled."""
+        if self._error is None and self.cancel_event is not None and self.cancel_event.is_set():
+            self._error = IngestionCancelled("Ingestion cancelled")
+        return self._error is None
+
+    def _embed_local(self, texts: List[str]) -> Tuple[List[List[float]], float]:
+        start = time.perf_counter()
+        vectors = self.embeddings.embed_documents(texts)
+        return vectors, time.perf_counter() - start
+
+    def _make_executor(self) -> Tuple[Executor, Callable[[List[str]], Tuple[List[List[float]], float]], int]:
+        if self.processes > 0:
+            executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                initializer=_init_embed_worker,
+                initargs=(settings.LOCAL_EMBEDDING_MODEL, settings.EMBEDDING_BACKEND),
+            )
+            return executor, _embed_in_worker, self.processes
+        return ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed"), self._embed_local, 1
+
+    def _stage(self, name: str, target: Callable, *args) -> threading.Thread:
+        def run():
+            try:
+                target(*args)
+            except BaseException as e:
+                logger.error(f"Ingestion stage '{name}' failed: {e}")
+                if self._error is None:
+                    self._error = e
+        thread = threading.Thread(target=run, name=f"ingest-{name}", daemon=True)
+        thread.start()
+        return thread
+
+    def _put(self, q: queue.Queue, item: Any):
+        # Bounded put that gives up once another stage has failed
+        while self._ok():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q: queue.Queue) -> Any:
+        while self._ok():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def run(
+        self,
+        docs: Iterable[Dict[str, Any]],
+        chunk_fn: Callable[[Dict[str, Any]], List[Document]],
+        index_fn: Callable[[List[Document], List[List[float]]], None],
+        select_fn: Optional[Callable[[Dict[str, Any], List[Document]], List[Document]]] = None,
+    ) -> Dict[str, int]:
+        """Stream docs through the stages. `chunk_fn` returns the chunks of one document;
+        `select_fn`, if given, is then called on this process with the document and its
+        chunks and returns the ones that need embedding. `index_fn` stores a batch of
+        chunks with their vectors.
+
+        With chunk_processes, `chunk_fn` runs on worker processes and must be picklable
+        (a module-level function or a partial of one). Chunks keep document order.
+        """
+        parsed: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        chunked: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        embedded: queue.Queue = queue.Queue(maxsize=max(2, self.processes * 2))
+
+        def parse_stage():
+            for doc in docs:
+                if not self._ok():
+                    break
+                self._put(parsed, doc)
+                self.progress["docs_parsed"] += 1
+            self._put(parsed, _DONE)
+
+        def emit(doc: Dict[str, Any], chunks: List[Document]):
+            if select_fn is not None:
+                chunks = select_fn(doc, chunks)
+            for chunk in chunks:
+                self._put(chunked, chunk)
+                self.progress["chunks_created"] += 1
+            self.progress["docs_chunked"] += 1
+
+        def chunk_stage():
+            if self.chunk_processes <= 0:
+                while (doc := self._get(parsed)) is not _DONE:
+                    emit(doc, chunk_fn(doc))
+                self._put(chunked, _DONE)
+                return
+            executor = ProcessPoolExecutor(max_workers=self.chunk_processes)
+            # Futures in submission order, a few per worker so none of them idles
+            pending: deque = deque()
+            try:
+                while (doc := self._get(parsed)) is not _DONE:
+                    pending.append((doc, executor.submit(chunk_fn, doc)))
+                    if len(pending) >= self.chunk_processes * 4:
+                        doc, future = pending.popleft()
+                        emit(doc, future.result())
+                while pending and self._ok():
+                    doc, future = pending.popleft()
+                    emit(doc, future.result())
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+                self._put(chunked, _DONE)
+
+        def embed_stage():
+            executor, embed_fn, workers = self._make_executor()
+            in_flight = threading.BoundedSemaphore(workers * 2)
+
+            def on_done(batch: List[Document], future: Future):
+                try:
+                    vectors, seconds = future.result()
+                    self.batch_size.record(len(batch), seconds)
+                    self.progress["chunks_embedded"] += len(batch)
+                    self._put(embedded, (batch, vectors))
+                except BaseException as e:
+                    if self._error is None:
+                        self._error = e
+                finally:
+                    in_flight.release()
+
+            def submit(batch: List[Document]):
+                in_flight.acquire()
+                future = executor.submit(embed_fn, [d.page_content for d in batch])
+                future.add_done_callback(lambda f, b=batch: on_done(b, f))
+
+            try:
+                batch: List[Document] = []
+                while (chunk := self._get(chunked)) is not _DONE:
+                    batch.append(chunk)
+                    if len(batch) >= self.batch_size.size:
+                        submit(batch)
+                        batch = []
+                if batch and self._ok():
+                    submit(batch)
+            finally:
+                executor.shutdown(wait=True)
+                self._put(embedded, _DONE)
+
+        def index_stage():
+            while (item := self._get(embedded)) is not _DONE:
+                batch, vectors = item
+                index_fn(batch, vectors)
+                self.progress["chunks_indexed"] += len(batch)
+
+        start = time.perf_counter()
+        threads = [
+            self._stage("parse", parse_stage),
+            self._stage("chunk", chunk_stage),
+            self._stage("embed", embed_stage),
+            self._stage("index", index_stage),
+        ]
+        for thread in threads:
+            thread.join()
+        if self._error is not None:
+            raise self._error
+
+        elapsed = time.perf_counter() - start
+        rate = self.progress["chunks_embedded"] / elapsed if elapsed > 0 else 0.0
+        logger.info(
+            f"Pipeline done in {elapsed:.1f}s: {self.progress}, {rate:.1f} chunks/s, final batch size {self.batch_size.size}"
+        )
+        return dict(self.progress)
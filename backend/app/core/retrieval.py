@@ -1,90 +1,535 @@
 import logging
 import os
-from typing import List, Tuple
-from langchain_community.vectorstores import FAISS
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, List, Sequence, Tuple, Dict, Optional
 from langchain_core.documents import Document
 #Github Test
+import faiss
 import numpy as np
 import pandas as pd
 
-from rank_bm25 import BM25Okapi
 from app.core.config import settings
+from app.core.embeddings import get_embeddings
+from app.core.fusion import fuse_scores
+from app.core.chunk_store import ChunkStore
+from app.core.index_versions import IndexVersions, CHUNKS_DIR, LEXICAL_DIR, documents_in_id_order
+from app.core.lexical import SparseBM25
+from app.core.vector_index import io_flags, is_cosine, load_ann_index, load_vector_store, normalize, to_similarity
+from app.core.metrics import INDEX_BYTES, INDEX_CHUNKS, INDEX_LOAD_SECONDS, INDEX_LOADS, INDEX_VERSION
 
 logger = logging.getLogger(__name__)
 
+
+class QueryBatcher:
+    """Coalesces concurrent query embeddings into one forward pass and one FAISS search.
+
+    Callers block on a Future while a single background thread gathers queries that
+    arrive within `max_wait_ms` (up to `max_batch_size`), embeds them together and
+    fans the dense hits back out. Callers pass the snapshot they hold, so a batch
+    that straddles a reload still searches each query against its own snapshot.
+    """
+
+    def __init__(self, retriever: 'HybridRetriever', max_batch_size: int, max_wait_ms: float):
+        self.retriever = retriever
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[Tuple[str, int, IndexSnapshot, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, query: str, k: int, snapshot: 'IndexSnapshot') -> Future:
+        """Queue a query. The future resolves to (hits, query_vector, batch_timings)."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((query, k, snapshot, future))
+        return future
+
+    def _ensure_worker(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch: List[Tuple[str, int, 'IndexSnapshot', Future]]):
+        try:
+            t0 = time.perf_counter()
+            vectors = np.asarray(self.retriever.embeddings.embed_documents([q for q, _, _, _ in batch]), dtype=np.float32)
+            t1 = time.perf_counter()
+            # One FAISS search per snapshot in the batch (almost always exactly one)
+            results: List[List[Tuple[int, float]]] = [[] for _ in batch]
+            by_snapshot: Dict[int, List[int]] = {}
+            for i, (_, _, snapshot, _) in enumerate(batch):
+                by_snapshot.setdefault(id(snapshot), []).append(i)
+            for positions in by_snapshot.values():
+                snapshot = batch[positions[0]][2]
+                hits = snapshot.dense_search(vectors[positions], max(batch[i][1] for i in positions))
+                for i, row_hits in zip(positions, hits):
+                    results[i] = row_hits
+            t2 = time.perf_counter()
+        except Exception as e:
+            for _, _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        batch_timings = {
+            "embed_ms": (t1 - t0) * 1000,
+            "dense_ms": (t2 - t1) * 1000,
+            "batch_size": float(len(batch)),
+        }
+        for (_, k, _, future), hits, vector in zip(batch, results, vectors):
+            future.set_result((hits[:k], vector, batch_timings))
+
+
+class IndexSnapshot:
+    """The dense index, BM25 matrix and chunk store of one index version, all sharing row ids.
+
+    Loaded together and never mutated afterwards, so a search that holds a
+    snapshot always sees a matching set even while a reload swaps in a new one.
+    Searches hold a reference for their duration; a retired snapshot is released
+    once the last of them finishes.
+    """
+
+    def __init__(self, index: faiss.Index, chunks: ChunkStore, path: str, version: Optional[int] = None):
+        self.index = index
+        self.chunks = chunks
+        self.path = path
+        self.version = version
+        self._refs = 0
+        self._retired = False
+        self._lock = threading.Lock()
+        self.bm25 = self._load_bm25()
+        # HNSW/IVF and/or compressed index answering dense searches; None searches the exact index
+        try:
+            self.ann_index = load_ann_index(path, index, mmap=settings.VECTOR_MMAP)
+        except (RuntimeError, ValueError) as e:
+            # e.g. an unsupported VECTOR_INDEX_TYPE/VECTOR_COMPRESSION pair; still serve the version
+            logger.error(f"No {settings.VECTOR_INDEX_TYPE} index for {path}, using exact search: {e}")
+            self.ann_index = None
+        # SQ8/PQ codes only approximate the scores, so their hits are re-scored against the exact vectors
+        self.rescore = self.ann_index is not None and settings.VECTOR_COMPRESSION != "none"
+
+    def _load_bm25(self) -> SparseBM25:
+        lexical_path = os.path.join(self.path, LEXICAL_DIR)
+        if SparseBM25.exists(lexical_path):
+            bm25 = SparseBM25.load(lexical_path, mmap=settings.BM25_MMAP)
+            if bm25.num_docs == len(self.chunks):
+                return bm25
+            logger.warning(f"BM25 index in {lexical_path} does not match the vector index, rebuilding")
+        else:
+            # Indexes built before the lexical index was persisted
+            logger.info(f"No saved BM25 index in {self.path}, building in memory")
+        return SparseBM25.build(self.chunks.texts())
+
+    @classmethod
+    def load(cls, path: str, embeddings, version: Optional[int] = None) -> 'IndexSnapshot':
+        # Memory-mapped: a snapshot is never mutated, and workers then share one copy of the vectors and texts
+        chunks_path = os.path.join(path, CHUNKS_DIR)
+        if ChunkStore.exists(chunks_path):
+            index = faiss.read_index(os.path.join(path, "index.faiss"), io_flags(settings.VECTOR_MMAP))
+            chunks = ChunkStore.load(chunks_path, mmap=settings.CHUNKS_MMAP)
+            if len(chunks) == index.ntotal:
+                return cls(index, chunks, path, version)
+            logger.warning(f"Chunk store in {chunks_path} does not match the vector index, rebuilding")
+        else:
+            # Indexes built before the chunk store; the pickled docstore is only read here
+            logger.info(f"No saved chunk store in {path}, building in memory")
+        vector_store = load_vector_store(path, embeddings, mmap=settings.VECTOR_MMAP)
+        return cls(vector_store.index, ChunkStore.build(documents_in_id_order(vector_store)), path, version)
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self._retired and self._refs == 0:
+                return False
+            self._refs += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._refs -= 1
+            if self._retired and self._refs == 0:
+                self._close()
+
+    def retire(self):
+        """Called when a newer snapshot takes over; frees this one once unused."""
+        with self._lock:
+            self._retired = True
+            if self._refs == 0:
+                self._close()
+
+    def _close(self):
+        logger.info(f"Releasing index version {self.version}")
+        self.index = None
+        self.chunks = None
+        self.bm25 = None
+        self.ann_index = None
+
+    def get_metadata(self, chunk_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Metadata of the given chunks; unknown IDs are absent."""
+        found = {}
+        for chunk_id in chunk_ids:
+            row = self.chunks.row(chunk_id)
+            if row is not None:
+                found[chunk_id] = self.chunks.metadata(row)
+        return found
+
+    def dense_search(self, vectors: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+        """One FAISS search for a batch of query vectors. Returns (row id, similarity) hits per query."""
+        exact = self.index
+        query_matrix = normalize(vectors) if is_cosine(exact) else np.array(vectors, dtype=np.float32)
+        index = self.ann_index if self.ann_index is not None else exact
+        scores, indices = index.search(query_matrix, k)
+        similarities = to_similarity(exact, scores)
+
+        # FAISS pads with -1 when there are fewer than k vectors
+        hits = [
+            [(int(i), float(s)) for s, i in zip(row_scores, row_indices) if i != -1]
+            for row_scores, row_indices in zip(similarities, indices)
+        ]
+        if self.rescore:
+            hits = [
+                sorted(self.similarities(query, [row for row, _ in row_hits]).items(), key=lambda hit: -hit[1])
+                for query, row_hits in zip(query_matrix, hits)
+            ]
+        return hits
+
+    def similarities(self, query_vector: np.ndarray, rows: List[int]) -> Dict[int, float]:
+        """Exact similarity from the query to specific rows (e.g. lexical-only candidates)."""
+        if not rows:
+            return {}
+        exact = self.index
+        try:
+            stored = np.vstack([exact.reconstruct(r) for r in rows])
+        except RuntimeError:
+            # Index type without reconstruct support; treat as dissimilar
+            return {}
+        if is_cosine(exact):
+            scores = stored @ normalize(query_vector)[0]
+        else:
+            scores = ((stored - np.asarray(query_vector, dtype=np.float32)) ** 2).sum(axis=1)
+        return dict(zip(rows, to_similarity(exact, scores).tolist()))
+
+
 class HybridRetriever:
     def __init__(self):
-        from langchain_community.embeddings import HuggingFaceEmbeddings
-
-        self.embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        self.embeddings = get_embeddings()
         self.index_path = os.path.join(settings.DATA_DIR, "faiss_index")
-        self.vector_store = None
-        self.bm25 = None
-        self.chunk_id_to_index = {} # Map chunk_id to index in self.documents
+        self.versions = IndexVersions(self.index_path)
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._swap_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.batcher = None
+        if settings.QUERY_BATCHING:
+            self.batcher = QueryBatcher(self, settings.QUERY_BATCH_MAX_SIZE, settings.QUERY_BATCH_MAX_WAIT_MS)
         self.load_index()
+        if settings.INDEX_WATCH_INTERVAL > 0:
+            threading.Thread(target=self._watch_versions, name="index-watcher", daemon=True).start()
+
+    @property
+    def snapshot(self) -> Optional[IndexSnapshot]:
+        return self._snapshot
+
+    # Read-only views of the current snapshot
+    @property
+    def index(self) -> Optional[faiss.Index]:
+        return self._snapshot.index if self._snapshot else None
+
+    @property
+    def chunks(self) -> Optional[ChunkStore]:
+        return self._snapshot.chunks if self._snapshot else None
+
+    @property
+    def bm25(self) -> Optional[SparseBM25]:
+        return self._snapshot.bm25 if self._snapshot else None
+
+    def _acquire_snapshot(self) -> Optional[IndexSnapshot]:
+        with self._swap_lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.acquire():
+                return snapshot
+            return None
 
-    def load_index(self):
-        if os.path.exists(self.index_path):
+    def _swap(self, snapshot: IndexSnapshot):
+        with self._swap_lock:
+            old, self._snapshot = self._snapshot, snapshot
+        if old is not None:
+            old.retire()
+
+    def load_index(self, path: Optional[str] = None):
+        """Load the live index version (or `path`) fully, then swap it in with a single pointer flip."""
+        with self._load_lock:
+            version = None
+            if path is None:
+                version = self.versions.current_version()
+                path = self.versions.current_path()
+                if self._snapshot is not None and version is not None and self._snapshot.version == version:
+                    return
+            if path and os.path.exists(path):
+                try:
+                    start = time.perf_counter()
+                    snapshot = IndexSnapshot.load(path, self.embeddings, version)
+                    self._swap(snapshot)
+                    elapsed = time.perf_counter() - start
+                    logger.info(f"Index and BM25 loaded successfully (version {version}, {elapsed:.2f}s)")
+                    INDEX_LOADS.labels(outcome="success").inc()
+                    INDEX_LOAD_SECONDS.set(elapsed)
+                    INDEX_CHUNKS.set(len(snapshot.chunks))
+                    INDEX_BYTES.set(_directory_size(path))
+                    INDEX_VERSION.set(version or 0)
+                except Exception as e:
+                    INDEX_LOADS.labels(outcome="error").inc()
+                    logger.error(f"Failed to load index: {e}")
+            else:
+                logger.warning("No index found. Ingestion needed.")
+
+    def _watch_versions(self):
+        """Reload when another process publishes a new version."""
+        while True:
+            time.sleep(settings.INDEX_WATCH_INTERVAL)
             try:
-                self.vector_store = FAISS.load_local(self.index_path, self.embeddings, allow_dangerous_deserialization=True)
-                
-                # Extracting from vector store docstore
-                self.documents = list(self.vector_store.docstore._dict.values())
-                # Create mapping from chunk_id to index
-                self.chunk_id_to_index = {doc.metadata.get("chunk_id"): i for i, doc in enumerate(self.documents)}
-                
-                tokenized_corpus = [doc.page_content.split() for doc in self.documents]
-                self.bm25 = BM25Okapi(tokenized_corpus)
-                logger.info("Index and BM25 loaded successfully")
+                version = self.versions.current_version()
+                current = self._snapshot.version if self._snapshot else None
+                if version is not None and version != current:
+                    logger.info(f"Index version {version} published, reloading")
+                    self.load_index()
             except Exception as e:
-                logger.error(f"Failed to load index: {e}")
-        else:
-            logger.warning("No index found. Ingestion needed.")
+                logger.error(f"Index watcher error: {e}")
+
+    def get_metadata(self, chunk_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Metadata for the given chunk IDs from the live snapshot; unknown IDs are absent."""
+        snapshot = self._acquire_snapshot()
+        if snapshot is None:
+            return {}
+        try:
+            return snapshot.get_metadata(chunk_ids)
+        finally:
+            snapshot.release()
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embeddings of many queries in one forward pass."""
+        return np.asarray(self.embeddings.embed_documents(queries), dtype=np.float32)
+
+    def get_documents(self, hits: List[Tuple[str, Optional[float]]]) -> List[Document]:
+        """Rebuild ranked results from (chunk_id, score) pairs, skipping chunks the live index no longer has.
 
-    def search(self, query: str, top_k: int = 8, alpha: float = 0.7) -> List[Document]:
-        if not self.vector_store or not self.bm25:
+        A None score leaves it out of the metadata."""
+        snapshot = self._acquire_snapshot()
+        if snapshot is None:
+            return []
+        try:
+            results = []
+            for chunk_id, score in hits:
+                row = snapshot.chunks.row(chunk_id)
+                if row is not None:
+                    results.append(snapshot.chunks.document(row, score))
+            return results
+        finally:
+            snapshot.release()
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 8,
+        alpha: Optional[float] = None,
+        fusion: Optional[str] = None,
+        timings: Optional[Dict[str, float]] = None,
+        query_vector: Optional[np.ndarray] = None,
+    ) -> List[Document]:
+        """Hybrid search. `alpha` and `fusion` default to the configured values (see app.core.fusion).
+
+        If `timings` is given, per-stage durations (ms) are written into it. A
+        precomputed (e.g. cached) `query_vector` skips the embedding step.
+        """
+        return self.search_with_vector(query, top_k, alpha, fusion, timings, query_vector)[0]
+
+    def search_with_vector(
+        self,
+        query: str,
+        top_k: int = 8,
+        alpha: Optional[float] = None,
+        fusion: Optional[str] = None,
+        timings: Optional[Dict[str, float]] = None,
+        query_vector: Optional[np.ndarray] = None,
+    ) -> Tuple[List[Document], Optional[np.ndarray]]:
+        """search(), also returning the query embedding so callers can cache it (None without an index)."""
+        alpha = settings.HYBRID_ALPHA if alpha is None else alpha
+        fusion = fusion or settings.FUSION_STRATEGY
+        if timings is None:
+            timings = {}
+        snapshot = self._acquire_snapshot()
+        if snapshot is None:
             self.load_index()
-            if not self.vector_store:
-                return []
+            snapshot = self._acquire_snapshot()
+            if snapshot is None:
+                return [], query_vector
+        try:
+            return self._search(snapshot, query, top_k, alpha, fusion, timings, query_vector)
+        finally:
+            snapshot.release()
+
+    def _search(
+        self,
+        snapshot: IndexSnapshot,
+        query: str,
+        top_k: int,
+        alpha: float,
+        fusion: str,
+        timings: Dict[str, float],
+        query_vector: Optional[np.ndarray] = None,
+    ) -> Tuple[List[Document], np.ndarray]:
+        num_candidates = top_k * 2
 
         # 1. Vector Search (get more than k to rerank)
-        vector_docs_with_scores = self.vector_store.similarity_search_with_score(query, k=top_k * 2)
+        t0 = time.perf_counter()
+        if query_vector is not None:
+            query_vector = np.asarray(query_vector, dtype=np.float32)
+            dense_hits = snapshot.dense_search(query_vector[None, :], num_candidates)[0]
+            timings["embed_ms"] = 0.0
+            timings["dense_ms"] = (time.perf_counter() - t0) * 1000
+        elif self.batcher:
+            dense_hits, query_vector, batch_timings = self.batcher.submit(query, num_candidates, snapshot).result()
+            timings.update(batch_timings)
+        else:
+            query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+            t1 = time.perf_counter()
+            dense_hits = snapshot.dense_search(query_vector[None, :], num_candidates)[0]
+            timings["embed_ms"] = (t1 - t0) * 1000
+            timings["dense_ms"] = (time.perf_counter() - t1) * 1000
+        t2 = time.perf_counter()
+        # Includes the time spent waiting for the batch window to close
+        timings["dense_total_ms"] = (t2 - t0) * 1000
         
-        # 2. BM25 Score
-        tokenized_query = query.split()
+        # 2. BM25 over the full corpus, which also contributes its own candidates
+        lexical_scores = snapshot.bm25.get_scores(query)
+        lexical_hits = snapshot.bm25.top_n(lexical_scores, num_candidates)
+        t3 = time.perf_counter()
+        timings["lexical_ms"] = (t3 - t2) * 1000
+
+        results = self._fuse(snapshot, query_vector, dense_hits, lexical_scores, lexical_hits, top_k, alpha, fusion)
+        timings["fusion_ms"] = (time.perf_counter() - t3) * 1000
         
-        combined_results = []
+        return results, query_vector
+
+    def search_batch(
+        self,
+        queries: List[str],
+        top_k: int = 8,
+        alpha: Optional[float] = None,
+        fusion: Optional[str] = None,
+        timings: Optional[Dict[str, float]] = None,
+        query_vectors: Optional[Sequence[Optional[np.ndarray]]] = None,
+    ) -> Tuple[List[List[Document]], Optional[np.ndarray]]:
+        """Hybrid search for many queries: one embedding pass, one FAISS search and one sparse BM25 product.
+
+        Same results as search() per query, up to float rounding in the BM25 sums. `query_vectors`
+        (one per query, e.g. cached) skips embedding those queries; None entries are embedded.
+        Returns the results and the query vectors (None without an index); `timings` gets the
+        durations (ms) of each batched stage.
+        """
+        alpha = settings.HYBRID_ALPHA if alpha is None else alpha
+        fusion = fusion or settings.FUSION_STRATEGY
+        if timings is None:
+            timings = {}
+        if not queries:
+            return [], None
+        snapshot = self._acquire_snapshot()
+        if snapshot is None:
+            self.load_index()
+            snapshot = self._acquire_snapshot()
+            if snapshot is None:
+                return [[] for _ in queries], None
+        try:
+            num_candidates = top_k * 2
+            t0 = time.perf_counter()
+            vectors = list(query_vectors) if query_vectors is not None else [None] * len(queries)
+            missing = [i for i, vector in enumerate(vectors) if vector is None]
+            if missing:
+                for i, vector in zip(missing, self.embed_queries([queries[i] for i in missing])):
+                    vectors[i] = vector
+            query_vectors = np.vstack(vectors).astype(np.float32)
+            t1 = time.perf_counter()
+            dense = snapshot.dense_search(query_vectors, num_candidates)
+            t2 = time.perf_counter()
+            lexical = snapshot.bm25.get_scores_batch(queries)
+            t3 = time.perf_counter()
+            results = []
+            for i in range(len(queries)):
+                # Dense per query for fusion, like get_scores(); the product above was the expensive part
+                lexical_scores = lexical.getrow(i).toarray().ravel()
+                lexical_hits = snapshot.bm25.top_n(lexical_scores, num_candidates)
+                results.append(self._fuse(
+                    snapshot, query_vectors[i], dense[i], lexical_scores, lexical_hits, top_k, alpha, fusion
+                ))
+            timings.update({
+                "embed_ms": (t1 - t0) * 1000,
+                "dense_ms": (t2 - t1) * 1000,
+                "lexical_ms": (t3 - t2) * 1000,
+                "fusion_ms": (time.perf_counter() - t3) * 1000,
+                "batch_size": float(len(queries)),
+            })
+            return results, query_vectors
+        finally:
+            snapshot.release()
+
+    def _fuse(
+        self,
+        snapshot: IndexSnapshot,
+        query_vector: np.ndarray,
+        dense_hits: List[Tuple[int, float]],
+        lexical_scores: np.ndarray,
+        lexical_hits: List[Tuple[int, float]],
+        top_k: int,
+        alpha: float,
+        fusion: str,
+    ) -> List[Document]:
+        """Fuse one query's dense and lexical candidates into its top_k documents."""
+        dense_scores = dict(dense_hits)
+        lexical_only = [row for row, _ in lexical_hits if row not in dense_scores]
+        dense_scores.update(snapshot.similarities(query_vector, lexical_only))
+
+        # 3. Fuse over the union of both candidate lists
+        candidates = list(dict.fromkeys([row for row, _ in dense_hits] + lexical_only))
+        dense_rank = {row: rank for rank, (row, _) in enumerate(dense_hits, start=1)}
+        lexical_rank = {row: rank for rank, (row, _) in enumerate(lexical_hits, start=1)}
         
-        for doc, vector_score in vector_docs_with_scores:
-            # Calculate BM25 score for this doc
-            chunk_id = doc.metadata.get("chunk_id")
-            doc_index = self.chunk_id_to_index.get(chunk_id)
-            
-            if doc_index is not None:
-                # get_batch_scores takes list of query tokens and list of doc indices
-                lexical_score = self.bm25.get_batch_scores(tokenized_query, [doc_index])[0]
-            else:
-                logger.warning(f"Chunk ID {chunk_id} not found in BM25 index")
-                lexical_score = 0.0
-            
-            # Normalize scores? Vector score (L2) is 0 to infinity. 
-            # If using Cosine, it's 0-1.
-            # Let's assume we want to combine them.
-            # Simple weighted sum.
-            
-            # Note: FAISS L2 distance: 0 is identical.
-            # We want similarity. Sim = 1 / (1 + distance)
-            similarity = 1 / (1 + vector_score)
-            
-            final_score = (alpha * similarity) + ((1 - alpha) * lexical_score)
-            
-            # Attach score to metadata
-            doc.metadata["score"] = float(final_score)
-            combined_results.append((doc, final_score))
-            
-        # Sort by final score
-        combined_results.sort(key=lambda x: x[1], reverse=True)
+        # Cosine similarity (1 / (1 + L2 distance) on indexes built before cosine)
+        similarities = np.array([dense_scores.get(row, 0.0) for row in candidates])
+        final_scores = fuse_scores(
+            fusion,
+            similarities,
+            lexical_scores[candidates],
+            np.array([dense_rank.get(row, np.inf) for row in candidates]),
+            np.array([lexical_rank.get(row, np.inf) for row in candidates]),
+            alpha=alpha,
+            rrf_k=settings.RRF_K,
+        )
         
-        return [doc for doc, score in combined_results[:top_k]]
+        # Documents are only materialized for the final top_k
+        return [
+            snapshot.chunks.document(candidates[i], float(final_scores[i]))
+            for i in np.argsort(-final_scores, kind="stable")[:top_k]
+        ]
+
+
+def _directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
 
 retriever = HybridRetriever()
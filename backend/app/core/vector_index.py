@@ -0,0 +1,189 @@
+import logging
+import math
+import os
+import pickle
+from typing import Optional
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ANN_DIR = "ann"  # Search indexes derived from index.faiss, one file per type/compression
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+COMPRESSIONS = ("none", "sq8", "pq")
+_PQ_MIN_VECTORS = 256  # One 8-bit PQ codebook needs at least this many training points
+_warned_no_ifc = False
+
+
+def is_cosine(index: faiss.Index) -> bool:
+    """Inner product over normalized vectors. Indexes built before that are plain L2."""
+    return index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+
+def normalize(vectors) -> np.ndarray:
+    matrix = np.array(vectors, dtype=np.float32, ndmin=2)
+    faiss.normalize_L2(matrix)
+    return matrix
+
+
+def to_similarity(index: faiss.Index, scores: np.ndarray) -> np.ndarray:
+    """FAISS scores as similarities: cosine as is, squared L2 distances as 1 / (1 + d)."""
+    if is_cosine(index):
+        return scores
+    return 1 / (1 + scores)
+
+
+def io_flags(mmap: bool) -> int:
+    """FAISS read flags. Memory-mapped indexes live in the shared page cache instead of
+    each process's heap, but are read-only: adding to one aborts the process."""
+    if not mmap:
+        return 0
+    # IO_FLAG_MMAP_IFC (FAISS >= 1.11) maps flat, SQ, PQ and HNSW codes and IVF lists. Never OR it
+    # with IO_FLAG_MMAP: FAISS then refuses to read IVF indexes ("mmap only supported for File objects")
+    if not hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        global _warned_no_ifc
+        if not _warned_no_ifc:
+            logger.warning(f"FAISS {faiss.__version__} cannot memory-map flat or HNSW indexes (needs >= 1.11); only IVF lists are mapped")
+            _warned_no_ifc = True
+        return faiss.IO_FLAG_MMAP
+    return faiss.IO_FLAG_MMAP_IFC
+
+
+def load_vector_store(path: str, embeddings, mmap: bool = False) -> FAISS:
+    """What FAISS.load_local reads (index.faiss plus the pickled docstore), with our read flags.
+
+    load_local only takes io_flags from langchain-community 0.4. The distance strategy is
+    read back from the index (it is not pickled). Only read-only snapshots may use `mmap`;
+    ingestion adds to and deletes from the index.
+    """
+    index = faiss.read_index(os.path.join(path, "index.faiss"), io_flags(mmap))
+    # Our own ingestion output, like the allow_dangerous_deserialization=True we passed before
+    with open(os.path.join(path, "index.pkl"), 'rb') as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    strategy = DistanceStrategy.MAX_INNER_PRODUCT if is_cosine(index) else DistanceStrategy.EUCLIDEAN_DISTANCE
+    return FAISS(embeddings, index, docstore, index_to_docstore_id, distance_strategy=strategy)
+
+
+def _nlist(n: int) -> int:
+    # ~4*sqrt(N) lists, but keep ~39 training points per centroid as k-means wants
+    return settings.IVF_NLIST or max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def _pq_m(dim: int) -> int:
+    if settings.IVF_PQ_M:
+        return settings.IVF_PQ_M
+    # One byte per 4 dimensions (16x smaller than float32); PQ needs the sub-quantizer count to divide the dimension
+    return next(m for m in range(max(1, dim // 4), 0, -1) if dim % m == 0)
+
+
+def factory_string(index_type: str, n: int, dim: int, compression: Optional[str] = None) -> str:
+    """FAISS index_factory description; `compression` (VECTOR_COMPRESSION) overrides how vectors are coded."""
+    compression = compression or settings.VECTOR_COMPRESSION
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown vector compression: {compression} (expected one of {', '.join(COMPRESSIONS)})")
+    pq = f"PQ{_pq_m(dim)}x8"
+    if index_type == "flat":
+        return {"none": "Flat", "sq8": "SQ8", "pq": pq}[compression]
+    if index_type == "hnsw":
+        if compression == "pq":
+            # FAISS's HNSW-PQ only scores L2 correctly, and our vectors are compared by inner product
+            raise ValueError("pq compression is not supported with hnsw; use sq8")
+        return f"HNSW{settings.HNSW_M},{'SQ8' if compression == 'sq8' else 'Flat'}"
+    if index_type in ("ivf_flat", "ivf_pq"):
+        codes = {"none": "Flat" if index_type == "ivf_flat" else pq, "sq8": "SQ8", "pq": pq}[compression]
+        return f"IVF{_nlist(n)},{codes}"
+    raise ValueError(f"Unknown vector index type: {index_type} (expected one of {', '.join(INDEX_TYPES)})")
+
+
+def build_ann_index(
+    flat_index: faiss.Index,
+    index_type: Optional[str] = None,
+    min_vectors: Optional[int] = None,
+    compression: Optional[str] = None,
+) -> Optional[faiss.Index]:
+    """Search index over the vectors of `flat_index`, with the same row ids and metric.
+
+    Approximate (HNSW/IVF), compressed (SQ8/PQ codes) or both. Returns None for
+    an uncompressed "flat", or when the index is too small for either to pay
+    off (ANN_MIN_VECTORS); searches then use the exact index.
+    """
+    index_type = index_type or settings.VECTOR_INDEX_TYPE
+    compression = compression or settings.VECTOR_COMPRESSION
+    min_vectors = settings.ANN_MIN_VECTORS if min_vectors is None else min_vectors
+    n, dim = flat_index.ntotal, flat_index.d
+    if index_type == "flat" and compression == "none":
+        return None
+    description = factory_string(index_type, n, dim, compression)
+    if n < max(min_vectors, _PQ_MIN_VECTORS if "PQ" in description else 1):
+        logger.info(f"{n} vectors, keeping exact search instead of {description}")
+        return None
+
+    logger.info(f"Building {description} index over {n} vectors")
+    vectors = flat_index.reconstruct_n(0, n)
+    index = faiss.index_factory(dim, description, flat_index.metric_type)
+    if index_type == "hnsw":
+        index.hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+    if not index.is_trained:
+        # A sample is enough to place the centroids
+        sample_size = min(n, max(_nlist(n) * 64, 50000))
+        sample = vectors[np.random.default_rng(0).choice(n, sample_size, replace=False)] if sample_size < n else vectors
+        index.train(sample)
+    index.add(vectors)
+    set_search_params(index)
+    return index
+
+
+def set_search_params(index: faiss.Index, ef_search: Optional[int] = None, nprobe: Optional[int] = None):
+    """Apply the query-time knobs (efSearch for HNSW, nprobe for IVF); other indexes have none."""
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        ivf = None
+    if ivf is not None:
+        ivf.nprobe = min(nprobe or settings.IVF_NPROBE, ivf.nlist)
+        return
+    hnsw = faiss.downcast_index(index)
+    if hasattr(hnsw, "hnsw"):
+        hnsw.hnsw.efSearch = ef_search or settings.HNSW_EF_SEARCH
+
+
+def ann_path(index_path: str) -> str:
+    name = settings.VECTOR_INDEX_TYPE
+    if settings.VECTOR_COMPRESSION != "none":
+        name += f"-{settings.VECTOR_COMPRESSION}"
+    return os.path.join(index_path, ANN_DIR, f"{name}.faiss")
+
+
+def save_ann_index(index: faiss.Index, index_path: str):
+    path = ann_path(index_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_ann_index(index_path: str, flat_index: faiss.Index, mmap: bool = False) -> Optional[faiss.Index]:
+    """The saved search index for VECTOR_INDEX_TYPE/VECTOR_COMPRESSION, built in memory if it is missing or stale."""
+    if settings.VECTOR_INDEX_TYPE == "flat" and settings.VECTOR_COMPRESSION == "none":
+        return None
+    path = ann_path(index_path)
+    if os.path.exists(path):
+        try:
+            index = faiss.read_index(path, io_flags(mmap))
+        except RuntimeError as e:
+            # An unreadable search index only costs speed: the exact index still answers
+            logger.error(f"Could not read {path}, using exact search: {e}")
+            return None
+        if index.ntotal == flat_index.ntotal and index.metric_type == flat_index.metric_type:
+            set_search_params(index)
+            return index
+        logger.warning(f"{path} does not match the vector index, rebuilding")
+    elif flat_index.ntotal >= settings.ANN_MIN_VECTORS:
+        # Indexes built before VECTOR_INDEX_TYPE was set
+        logger.info(f"No saved {os.path.basename(path)} in {index_path}, building in memory")
+    return build_ann_index(flat_index)
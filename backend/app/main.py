@@ -1,7 +1,12 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from app.core.config import settings
 from app.api.endpoints import router
+from app.core.executor import get_retrieval_executor
+from app.core.cache import get_cache
+from app.core.retrieval import retriever
+from app.core.metrics import registry
 
 app = FastAPI(title=settings.PROJECT_NAME)
 
@@ -16,6 +21,27 @@ app.add_middleware(
 
 app.include_router(router, prefix="/api")
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint (all workers' metrics when PROMETHEUS_MULTIPROC_DIR is set)."""
+    return Response(registry.render(), media_type=registry.content_type)
+
+@app.on_event("startup")
+async def start_cache_sweeper():
+    get_cache().start_sweeper(lambda: retriever.snapshot.version if retriever.snapshot else None)
+
+@app.on_event("shutdown")
+def shutdown_retrieval_pool():
+    get_retrieval_executor().shutdown()
+
+@app.on_event("shutdown")
+async def close_cache():
+    await get_cache().close()
+
+@app.on_event("shutdown")
+def drop_worker_metrics():
+    registry.worker_exit()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -4,7 +4,7 @@ from typing import List, Tuple
 
 from fastapi import FastAPI, Request, Header, HTTPException
 import gitlab
-from openai import OpenAI
+from openai import AsyncOpenAI
 import numpy as np
 import pandas as pd
 import logging as log
@@ -19,16 +19,25 @@ WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
 MAX_TOKENS = 1200
 MAX_DIFF_CHARS = 12000
 CHUNK_SIZE = 4000
+OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", "3"))
+REVIEW_WORKERS = int(os.getenv("REVIEW_WORKERS", "2"))  # MRs reviewed at the same time
+REVIEW_QUEUE_SIZE = int(os.getenv("REVIEW_QUEUE_SIZE", "100"))
 
 AI_NOTE_MARKER = "<!-- AI_CODE_REVIEW -->"
 
 # -------------------- APP INIT --------------------
 
 app = FastAPI()
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = AsyncOpenAI(api_key=OPENAI_API_KEY)
 gl = gitlab.Gitlab(GITLAB_URL, private_token=GITLAB_TOKEN)
 
-_semaphore = asyncio.Semaphore(3)
+# Caps OpenAI calls in flight across all reviews
+_semaphore = asyncio.Semaphore(OPENAI_CONCURRENCY)
+
+# Webhooks only enqueue; workers do the reviews so GitLab gets its response right away
+_queue: "asyncio.Queue[dict]" = asyncio.Queue(maxsize=REVIEW_QUEUE_SIZE)
+_pending = set()  # (project_id, mr_iid) waiting in the queue; repeat events for them are dropped
+_workers: List[asyncio.Task] = []
 
 # -------------------- TOKEN TRACKER --------------------
 
@@ -120,7 +129,7 @@ Partial reviews:
 
 async def _call_openai(prompt: str, max_tokens: int) -> str:
     async with _semaphore:
-        resp = client.chat.completions.create(
+        resp = await client.chat.completions.create(
             model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": "You are a conservative enterprise code auditor."},
@@ -164,24 +173,30 @@ def _has_critical(review: str) -> bool:
                 return True
     return False
 
-# -------------------- WEBHOOK --------------------
+# -------------------- GITLAB --------------------
 
-@app.post("/webhook")
-async def webhook(request: Request, x_gitlab_token: str = Header(default="")):
-    if not _verify_secret(x_gitlab_token):
-        raise HTTPException(status_code=403)
+# python-gitlab is synchronous; its calls run on threads so they never block the event loop
 
-    payload = await request.json()
-    if payload.get("object_kind") != "merge_request":
-        return {"ok": True}
+def _fetch_changes(project_id: int, mr_iid: int):
+    project = gl.projects.get(project_id)
+    mr = project.mergerequests.get(mr_iid)
+    return mr, mr.changes()["changes"]
+
+
+def _post_note(mr, body: str):
+    mr.notes.create({"body": body})
+
+# -------------------- REVIEW --------------------
 
+def _mr_key(payload: dict) -> Tuple[int, int]:
+    return int(payload["project"]["id"]), int(payload["object_attributes"]["iid"])
+
+
+async def _review(payload: dict) -> dict:
     mr_attr = payload["object_attributes"]
-    project_id = int(payload["project"]["id"])
-    mr_iid = int(mr_attr["iid"])
+    project_id, mr_iid = _mr_key(payload)
 
-    project = gl.projects.get(project_id)
-    mr = project.mergerequests.get(mr_iid)
-    changes = mr.changes()["changes"]
+    mr, changes = await asyncio.to_thread(_fetch_changes, project_id, mr_iid)
 
     full_diff, skipped = _assemble_full_diff(changes)
     if not full_diff.strip():
@@ -189,17 +204,19 @@ async def webhook(request: Request, x_gitlab_token: str = Header(default="")):
 
     chunks = _chunk_diff_text(full_diff)
 
-    reviews = []
-    for c in chunks:
-        prompt = _build_prompt(
+    # All chunks at once; the semaphore decides how many actually run
+    prompts = [
+        _build_prompt(
             payload["project"]["path_with_namespace"],
             mr_attr.get("title", ""),
             mr_attr.get("author", {}).get("name", ""),
             c,
         )
-        reviews.append(await _call_openai(prompt, MAX_TOKENS))
+        for c in chunks
+    ]
+    reviews = await asyncio.gather(*(_call_openai(p, MAX_TOKENS) for p in prompts))
 
-    reviews = _sanitize_reviews(reviews)
+    reviews = _sanitize_reviews(list(reviews))
     if not reviews:
         return {"ok": True, "review": "No actionable findings"}
 
@@ -208,7 +225,7 @@ async def webhook(request: Request, x_gitlab_token: str = Header(default="")):
     mandatory = _has_critical(final)
     body = AI_NOTE_MARKER + "\n\n" + final
 
-    mr.notes.create({"body": body})
+    await asyncio.to_thread(_post_note, mr, body)
 
     return {
         "ok": True,
@@ -216,8 +233,59 @@ async def webhook(request: Request, x_gitlab_token: str = Header(default="")):
         "tokens_used": tracker.total
     }
 
+
+async def _worker():
+    while True:
+        payload = await _queue.get()
+        project_id, mr_iid = key = _mr_key(payload)
+        _pending.discard(key)
+        try:
+            result = await _review(payload)
+            log.info(f"Reviewed MR !{mr_iid} of project {project_id}: {result}")
+        except Exception:
+            log.exception(f"Review of MR !{mr_iid} of project {project_id} failed")
+        finally:
+            _queue.task_done()
+
+
+@app.on_event("startup")
+async def start_workers():
+    for _ in range(REVIEW_WORKERS):
+        _workers.append(asyncio.create_task(_worker()))
+
+
+@app.on_event("shutdown")
+async def stop_workers():
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+# -------------------- WEBHOOK --------------------
+
+@app.post("/webhook")
+async def webhook(request: Request, x_gitlab_token: str = Header(default="")):
+    if not _verify_secret(x_gitlab_token):
+        raise HTTPException(status_code=403)
+
+    payload = await request.json()
+    if payload.get("object_kind") != "merge_request":
+        return {"ok": True}
+
+    key = _mr_key(payload)
+    if key in _pending:
+        # Not started yet, so that review will already see the latest changes
+        return {"ok": True, "queued": True}
+    try:
+        _queue.put_nowait(payload)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="Review queue is full")
+    _pending.add(key)
+
+    return {"ok": True, "queued": True}
+
 # -------------------- HEALTH --------------------
 
 @app.get("/")
 def root():
-    return {"ok": True, "service": "GitLab AI MR Bot"}
+    return {"ok": True, "service": "GitLab AI MR Bot", "queued_reviews": _queue.qsize()}
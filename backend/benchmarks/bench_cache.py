@@ -0,0 +1,93 @@
+"""
+Cache lookup cost on the hit and miss paths of each tier.
+
+Usage: python benchmarks/bench_cache.py [--iterations 1000] [--semantic-entries 1000]
+
+Measures answer-cache misses, L1 hits, L2 (Redis) hits, stores, and semantic
+lookups against an index of --semantic-entries cached questions. The Redis
+paths are skipped when REDIS_URL is unset or unreachable. Entries are written
+under a throwaway index version, so real cached answers are never hit.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import summarize, write_results
+from app.core.cache import get_cache
+
+BENCH_VERSION = -1  # Namespace that no real index ever uses
+DIMENSION = 384
+
+
+async def timed(samples, coro):
+    start = time.perf_counter()
+    result = await coro
+    samples.append((time.perf_counter() - start) * 1000)
+    return result
+
+
+async def run(iterations: int, semantic_entries: int) -> dict:
+    cache = get_cache()
+    rng = np.random.default_rng(0)
+    chunk_ids = [f"bench_chunk_{i}" for i in range(8)]
+    sources = [{"chunk_id": c, "snippet": "x" * 200, "score": 0.5} for c in chunk_ids]
+    answer = "benchmark answer " * 40
+    samples = {name: [] for name in ("set", "miss", "l1_hit", "l2_hit", "semantic_hit", "semantic_miss")}
+
+    for i in range(iterations):
+        query = f"bench query {i}"
+        await timed(samples["miss"], cache.get_answer(query, chunk_ids, "bench", BENCH_VERSION))
+        await timed(samples["set"], cache.set_answer(query, chunk_ids, answer, sources, 8, "bench", BENCH_VERSION))
+        await timed(samples["l1_hit"], cache.get_answer(query, chunk_ids, "bench", BENCH_VERSION))
+
+    redis_available = cache.client is not None and cache.breaker.state == "closed"
+    if redis_available:
+        for i in range(iterations):
+            cache.local.clear()
+            await timed(samples["l2_hit"], cache.get_answer(f"bench query {i}", chunk_ids, "bench", BENCH_VERSION))
+        redis_available = cache.breaker.state == "closed"
+
+    # Semantic tier: index `semantic_entries` questions, then probe with near and far vectors
+    vectors = rng.normal(size=(semantic_entries, DIMENSION)).astype(np.float32)
+    for i, vector in enumerate(vectors):
+        await cache.set_answer(f"semantic {i}", chunk_ids, answer, sources, 8, "semantic", BENCH_VERSION, vector)
+    for i in range(iterations):
+        near = vectors[i % semantic_entries] + rng.normal(0, 0.01, DIMENSION).astype(np.float32)
+        await timed(samples["semantic_hit"], cache.find_similar(near, 8, "semantic", BENCH_VERSION))
+        far = rng.normal(size=DIMENSION).astype(np.float32)
+        await timed(samples["semantic_miss"], cache.find_similar(far, 8, "semantic", BENCH_VERSION))
+
+    layers = (await cache.stats())["layers"]
+    await cache.close()
+    if not redis_available:
+        samples.pop("l2_hit")
+    return {
+        "iterations": iterations,
+        "semantic_entries": semantic_entries,
+        "redis": redis_available,
+        "latency_ms": {name: summarize(values) for name, values in samples.items()},
+        "layers": layers,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--semantic-entries", type=int, default=1000)
+    parser.add_argument("--output", default=None, help="Result JSON path (default benchmarks/results/)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.iterations, args.semantic_entries))
+    for name, summary in results["latency_ms"].items():
+        print(f"{name:>14}: p50 {summary['p50']:.3f}ms p99 {summary['p99']:.3f}ms")
+    write_results("cache", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
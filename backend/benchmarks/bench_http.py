@@ -0,0 +1,143 @@
+"""
+Concurrent HTTP load against /api/query, streaming and non-streaming.
+
+Usage: python benchmarks/bench_http.py [--url http://localhost:8000] [--concurrency 16] [--requests 200]
+
+Without --url the app is started in-process on a free port with the stub
+generation backend (GENERATION_BACKEND=stub unless set otherwise), so the
+whole serving path is measured without Gemini keys or network access. When
+pointing at a running server, start it with GENERATION_BACKEND=stub for
+comparable numbers.
+
+Reports latency, time-to-first-token and tokens/s (streaming), throughput
+and errors per mode. --unique makes every query text distinct so the exact
+cache layers miss; otherwise the eval queries repeat and mostly hit.
+"""
+import os
+
+os.environ.setdefault("GENERATION_BACKEND", "stub")
+
+import argparse
+import asyncio
+import json
+import socket
+import sys
+import threading
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import load_queries, per_second, summarize, write_results
+from app.core.config import settings
+
+
+def start_server() -> str:
+    """Serve app.main:app with uvicorn on a background thread; returns its base URL."""
+    import uvicorn
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config("app.main:app", host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="bench-server", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+async def one_request(client: httpx.AsyncClient, payload: dict) -> dict:
+    start = time.perf_counter()
+    first_token = None
+    tokens = 0
+    ok = True
+    if payload["stream"]:
+        async with client.stream("POST", "/api/query", json=payload) as response:
+            ok = response.status_code == 200
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event["type"] == "token":
+                    tokens += 1
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                elif event["type"] == "error":
+                    ok = False
+    else:
+        response = await client.post("/api/query", json=payload)
+        ok = response.status_code == 200 and "error" not in response.json()
+    return {"ok": ok, "seconds": time.perf_counter() - start, "first_token": first_token, "tokens": tokens}
+
+
+async def run_mode(base_url: str, queries, stream: bool, concurrency: int, total: int, top_k: int, unique: bool) -> dict:
+    counter = iter(range(total))
+    outcomes = []
+
+    async def worker(client: httpx.AsyncClient):
+        for i in counter:
+            query = queries[i % len(queries)]
+            if unique:
+                query = f"{query} (request {i} at {time.time_ns()})"
+            try:
+                outcomes.append(await one_request(client, {"query": query, "top_k": top_k, "stream": stream}))
+            except httpx.HTTPError:
+                outcomes.append({"ok": False, "seconds": 0.0, "first_token": None, "tokens": 0})
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    succeeded = [o for o in outcomes if o["ok"]]
+    result = {
+        "requests": len(outcomes),
+        "errors": len(outcomes) - len(succeeded),
+        "seconds": elapsed,
+        "requests_per_s": per_second(len(succeeded), elapsed),
+        "latency_ms": summarize([o["seconds"] * 1000 for o in succeeded]),
+    }
+    if stream:
+        streamed = [o for o in succeeded if o["first_token"] is not None]
+        result["ttft_ms"] = summarize([o["first_token"] * 1000 for o in streamed])
+        result["tokens_per_s"] = summarize([
+            per_second(o["tokens"] - 1, o["seconds"] - o["first_token"]) for o in streamed if o["tokens"] > 1
+        ])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="Base URL of a running server (default: start one in-process)")
+    parser.add_argument("--queries", default=os.path.join(settings.DATA_DIR, "eval_queries.jsonl"))
+    parser.add_argument("--modes", nargs="+", default=["json", "stream"], choices=["json", "stream"])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per mode")
+    parser.add_argument("--top-k", type=int, default=settings.TOP_K)
+    parser.add_argument("--unique", action="store_true", help="Make every query distinct to defeat the exact caches")
+    parser.add_argument("--output", default=None, help="Result JSON path (default benchmarks/results/)")
+    args = parser.parse_args()
+
+    base_url = args.url or start_server()
+    queries = load_queries(args.queries)
+    results = {
+        "url": args.url or "in-process",
+        "concurrency": args.concurrency,
+        "unique_queries": args.unique,
+        "modes": {},
+    }
+    for mode in args.modes:
+        result = asyncio.run(run_mode(base_url, queries, mode == "stream", args.concurrency, args.requests, args.top_k, args.unique))
+        results["modes"][mode] = result
+        line = f"{mode}: {result['requests_per_s']:.1f} req/s, p50 {result['latency_ms'].get('p50', 0):.0f}ms, " \
+               f"p95 {result['latency_ms'].get('p95', 0):.0f}ms, {result['errors']} errors"
+        if mode == "stream":
+            line += f", ttft p50 {result['ttft_ms'].get('p50', 0):.0f}ms"
+        print(line)
+    write_results("http", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Ingestion throughput, stage by stage and end to end.
+
+Usage: python benchmarks/bench_ingestion.py [--file ../data/uffizio_knowledge.txt] [--repeat 3] [--chunk-processes 4]
+
+Stages are timed in isolation (load_file, chunk_documents, batch_embed_and_index)
+and then together through the pipelined ingest_into, all against a temporary
+index directory, so the live index is never touched. --file may be a directory
+of knowledge files; --chunk-processes overrides CHUNK_PROCESSES for the
+pipelined run.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import Timer, per_second, summarize, write_results
+from app.core.config import settings
+from app.core.ingestion import IngestionManager
+from app.core.loader import source_files
+
+
+def run_once(file_path: str, workdir: str) -> dict:
+    manager = IngestionManager()
+    # Keep the audit file and index out of DATA_DIR
+    manager.metadata_path = os.path.join(workdir, settings.METADATA_FILE)
+
+    with Timer() as t_load:
+        docs = manager.load_file(file_path)
+    with Timer() as t_chunk:
+        chunks = manager.chunk_documents(docs)
+    with Timer() as t_embed:
+        manager.vector_store = None
+        manager.batch_embed_and_index(chunks)
+
+    index_path = os.path.join(workdir, "index")
+    os.makedirs(index_path)
+    progress = {}
+    with Timer() as t_total:
+        total = manager.ingest_into(index_path, file_path, full_rebuild=True, progress=progress)
+
+    return {
+        "docs": len(docs),
+        "chunks": len(chunks),
+        "load_file": {"seconds": t_load.seconds, "docs_per_s": per_second(len(docs), t_load.seconds),
+                      "mb_per_s": per_second(sum(map(os.path.getsize, source_files(file_path))) / 1e6, t_load.seconds)},
+        "chunk_documents": {"seconds": t_chunk.seconds, "chunks_per_s": per_second(len(chunks), t_chunk.seconds)},
+        "batch_embed_and_index": {"seconds": t_embed.seconds, "chunks_per_s": per_second(len(chunks), t_embed.seconds)},
+        "pipelined_ingest": {"seconds": t_total.seconds, "chunks_per_s": per_second(total, t_total.seconds),
+                             "progress": progress},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", default=os.path.join(settings.DATA_DIR, settings.KNOWLEDGE_FILE))
+    parser.add_argument("--repeat", type=int, default=1, help="Runs to average; the first also loads the model")
+    parser.add_argument("--chunk-processes", type=int, default=None, help="Override CHUNK_PROCESSES")
+    parser.add_argument("--output", default=None, help="Result JSON path (default benchmarks/results/)")
+    args = parser.parse_args()
+    if args.chunk_processes is not None:
+        settings.CHUNK_PROCESSES = args.chunk_processes
+
+    runs = []
+    for i in range(args.repeat):
+        workdir = tempfile.mkdtemp(prefix="bench-ingest-")
+        try:
+            runs.append(run_once(args.file, workdir))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        print(f"Run {i + 1}: " + ", ".join(
+            f"{stage} {runs[-1][stage]['seconds']:.2f}s"
+            for stage in ("load_file", "chunk_documents", "batch_embed_and_index", "pipelined_ingest")
+        ))
+
+    stages = ("load_file", "chunk_documents", "batch_embed_and_index", "pipelined_ingest")
+    results = {
+        "file": args.file,
+        "docs": runs[-1]["docs"],
+        "chunks": runs[-1]["chunks"],
+        "stages": {stage: summarize([run[stage]["seconds"] * 1000 for run in runs]) for stage in stages},
+        "runs": runs,
+    }
+    write_results("ingestion", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
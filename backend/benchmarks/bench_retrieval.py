@@ -0,0 +1,117 @@
+"""
+HybridRetriever.search latency across top_k and corpus size.
+
+Usage: python benchmarks/bench_retrieval.py [--scales 1 10 100] [--top-k 1 4 8 16] [--rounds 3]
+
+Scale 1 is the live index. Larger scales are synthetic: every chunk is copied
+scale-1 more times with its vector slightly perturbed and its words shuffled,
+so FAISS and BM25 see a realistic size and term distribution without
+re-embedding anything. Searches run in-process with query batching off, so
+the numbers are per-query latency rather than batch-window waits.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import load_queries, summarize, write_results
+from app.core.chunk_store import ChunkStore
+from app.core.config import settings
+from app.core.retrieval import IndexSnapshot, retriever
+from app.core.vector_index import is_cosine, normalize
+from langchain_core.documents import Document
+
+STAGES = ("embed_ms", "dense_ms", "lexical_ms", "fusion_ms")
+
+
+def synthetic_snapshot(base: IndexSnapshot, scale: int, workdir: str, noise: float, seed: int = 0) -> IndexSnapshot:
+    vectors = base.index.reconstruct_n(0, base.index.ntotal)
+    rng = np.random.default_rng(seed)
+    index = faiss.IndexFlat(base.index.d, base.index.metric_type)
+    documents = []
+    for copy in range(scale):
+        copy_vectors = vectors if copy == 0 else vectors + rng.normal(0, noise, vectors.shape).astype(np.float32)
+        if copy and is_cosine(base.index):
+            copy_vectors = normalize(copy_vectors)
+        index.add(copy_vectors)
+        for row in range(len(base.chunks)):
+            doc = base.chunks.document(row)
+            words = doc.page_content.split()
+            if copy:
+                rng.shuffle(words)
+            metadata = {**doc.metadata, "chunk_id": f"{doc.metadata['chunk_id']}~{copy}"}
+            documents.append(Document(page_content=" ".join(words), metadata=metadata))
+    # No saved BM25 (or ANN index) in workdir, so the snapshot builds them in memory
+    return IndexSnapshot(index, ChunkStore.build(documents), workdir)
+
+
+def bench_snapshot(snapshot: IndexSnapshot, queries, top_ks, rounds: int) -> dict:
+    results = {}
+    for top_k in top_ks:
+        totals, stages = [], {stage: [] for stage in STAGES}
+        for _ in range(rounds):
+            for query in queries:
+                timings = {}
+                start = time.perf_counter()
+                retriever._search(snapshot, query, top_k, settings.HYBRID_ALPHA, settings.FUSION_STRATEGY, timings)
+                totals.append((time.perf_counter() - start) * 1000)
+                for stage in STAGES:
+                    stages[stage].append(timings.get(stage, 0.0))
+        results[f"top_k={top_k}"] = {
+            "total_ms": summarize(totals),
+            "stages": {stage: summarize(samples) for stage, samples in stages.items()},
+        }
+        print(f"  top_k={top_k}: p50 {results[f'top_k={top_k}']['total_ms']['p50']:.2f}ms "
+              f"p95 {results[f'top_k={top_k}']['total_ms']['p95']:.2f}ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default=os.path.join(settings.DATA_DIR, "eval_queries.jsonl"))
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--noise", type=float, default=0.01, help="Std-dev of the noise added to synthetic vectors")
+    parser.add_argument("--output", default=None, help="Result JSON path (default benchmarks/results/)")
+    args = parser.parse_args()
+
+    retriever.load_index()
+    base = retriever.snapshot
+    if base is None:
+        print("No index found. Run ingestion first.")
+        sys.exit(1)
+    retriever.batcher = None
+    queries = load_queries(args.queries)
+    # Warm up the embedding model and FAISS
+    for query in queries[:3]:
+        retriever._search(base, query, 8, settings.HYBRID_ALPHA, settings.FUSION_STRATEGY, {})
+
+    results = {"queries": len(queries), "rounds": args.rounds, "scales": {}}
+    for scale in args.scales:
+        workdir = tempfile.mkdtemp(prefix="bench-retrieval-")
+        try:
+            start = time.perf_counter()
+            snapshot = base if scale == 1 else synthetic_snapshot(base, scale, workdir, args.noise)
+            build_s = time.perf_counter() - start
+            print(f"Scale {scale}x: {len(snapshot.chunks)} chunks (built in {build_s:.1f}s)")
+            results["scales"][f"{scale}x"] = {
+                "chunks": len(snapshot.chunks),
+                "build_seconds": build_s,
+                "top_k": bench_snapshot(snapshot, queries, args.top_k, args.rounds),
+            }
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    write_results("retrieval", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Shared helpers for the benchmark scripts: timing summaries and JSON result files.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from app.core.config import settings
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    """Latency percentiles (ms) of a list of samples."""
+    if not samples_ms:
+        return {"count": 0}
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "count": int(samples.size),
+        "mean": float(samples.mean()),
+        "p50": float(np.percentile(samples, 50)),
+        "p90": float(np.percentile(samples, 90)),
+        "p95": float(np.percentile(samples, 95)),
+        "p99": float(np.percentile(samples, 99)),
+        "max": float(samples.max()),
+    }
+
+
+def per_second(count: float, seconds: float) -> float:
+    return count / seconds if seconds > 0 else 0.0
+
+
+class Timer:
+    """Context manager recording elapsed wall time in seconds."""
+
+    def __enter__(self) -> 'Timer':
+        self.start = time.perf_counter()
+        self.seconds = 0.0
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+
+    @property
+    def ms(self) -> float:
+        return self.seconds * 1000
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    """What a result depends on besides the code, so runs are only compared like for like."""
+    return {
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            "LOCAL_EMBEDDING_MODEL": settings.LOCAL_EMBEDDING_MODEL,
+            "EMBEDDING_BACKEND": settings.EMBEDDING_BACKEND,
+            "GENERATION_BACKEND": settings.GENERATION_BACKEND,
+            "FUSION_STRATEGY": settings.FUSION_STRATEGY,
+            "RETRIEVAL_EXECUTOR": settings.RETRIEVAL_EXECUTOR,
+            "RETRIEVAL_WORKERS": settings.RETRIEVAL_WORKERS,
+            "QUERY_BATCHING": settings.QUERY_BATCHING,
+            "CHUNK_SIZE": settings.CHUNK_SIZE,
+            "CHUNK_OVERLAP": settings.CHUNK_OVERLAP,
+        },
+    }
+
+
+def write_results(name: str, results: Dict[str, Any], output: Optional[str] = None) -> str:
+    """Write results with run metadata to `output` (default benchmarks/results/<name>-<timestamp>.json)."""
+    now = datetime.now(timezone.utc)
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{now.strftime('%Y%m%d-%H%M%S')}.json")
+    payload = {
+        "benchmark": name,
+        "created_at": now.isoformat(),
+        "environment": environment(),
+        "results": results,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2)
+    print(f"Results written to {output}")
+    return output
+
+
+def load_queries(path: Optional[str] = None) -> List[str]:
+    """Query texts from the labeled eval set (one JSON object per line)."""
+    path = path or os.path.join(settings.DATA_DIR, "eval_queries.jsonl")
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line)["query"] for line in f if line.strip()]
@@ -0,0 +1,73 @@
+"""
+Compare two benchmark result files and flag regressions.
+
+Usage: python benchmarks/compare.py OLD.json NEW.json [--threshold 0.10]
+
+Every numeric leaf present in both files is compared. Latencies (keys under
+*_ms or named mean/p50/.../max) regress when they grow, rates (*_per_s)
+when they shrink. Exits with status 1 if any metric regressed by more than
+--threshold, so it can gate CI.
+"""
+import argparse
+import json
+import sys
+from typing import Dict
+
+LATENCY_KEYS = {"mean", "p50", "p90", "p95", "p99", "max", "seconds"}
+
+
+def flatten(node, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    if isinstance(node, dict):
+        for key, value in node.items():
+            flat.update(flatten(value, f"{prefix}.{key}" if prefix else key))
+    elif isinstance(node, (int, float)) and not isinstance(node, bool):
+        flat[prefix] = float(node)
+    return flat
+
+
+def direction(path: str) -> int:
+    """+1 if bigger is worse, -1 if smaller is worse, 0 if not a performance metric."""
+    parts = path.split(".")
+    if any(part.endswith("_per_s") for part in parts):
+        return -1
+    if parts[-1] in LATENCY_KEYS:
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change that counts (default 10%%)")
+    args = parser.parse_args()
+
+    with open(args.old, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(args.new, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    if old.get("benchmark") != new.get("benchmark"):
+        print(f"Warning: comparing '{old.get('benchmark')}' with '{new.get('benchmark')}'")
+
+    old_flat, new_flat = flatten(old["results"]), flatten(new["results"])
+    regressions = improvements = 0
+    for path in sorted(old_flat.keys() & new_flat.keys()):
+        sign = direction(path)
+        before, after = old_flat[path], new_flat[path]
+        if sign == 0 or before == 0:
+            continue
+        change = (after - before) / abs(before)
+        if abs(change) < args.threshold:
+            continue
+        worse = change * sign > 0
+        regressions += worse
+        improvements += not worse
+        print(f"{'REGRESSION' if worse else 'improved  '} {path}: {before:.3f} -> {after:.3f} ({change:+.1%})")
+
+    print(f"{regressions} regressions, {improvements} improvements beyond {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
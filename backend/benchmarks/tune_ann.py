@@ -0,0 +1,169 @@
+"""
+Recall/latency sweep of the approximate vector indexes against exact search.
+
+Usage: python benchmarks/tune_ann.py [--types hnsw ivf_flat ivf_pq] [--compression none sq8 pq]
+                                     [--scale 10] [--k 16] [--target-recall 0.95]
+
+Vectors come from the live index; --scale S adds S-1 perturbed copies of every
+vector (as in bench_retrieval.py) to tune for a bigger corpus than we have.
+Queries are the eval set embeddings, topped up with perturbed corpus vectors.
+For each index type the search knob (efSearch for HNSW, nprobe for IVF) is
+swept and recall@k against the exact top-k is reported next to per-query
+latency; the smallest value reaching --target-recall is suggested for
+HNSW_EF_SEARCH / IVF_NPROBE. Each --compression (VECTOR_COMPRESSION) is tried
+per type, with the index size next to the exact one. Recall is measured on the
+raw index results, before the retriever re-scores compressed hits. k defaults
+to 16, the dense candidates of a top_k=8 search.
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.common import Timer, load_queries, summarize, write_results
+from app.core.config import settings
+from app.core.retrieval import retriever
+from app.core.vector_index import (
+    COMPRESSIONS, INDEX_TYPES, build_ann_index, factory_string, is_cosine, normalize, set_search_params,
+)
+
+EF_SEARCH = (16, 32, 64, 128, 256, 512)
+NPROBE = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def corpus_vectors(exact: faiss.Index, scale: int, noise: float, rng) -> np.ndarray:
+    vectors = exact.reconstruct_n(0, exact.ntotal)
+    copies = [vectors] + [vectors + rng.normal(0, noise, vectors.shape).astype(np.float32) for _ in range(scale - 1)]
+    corpus = np.vstack(copies)
+    return normalize(corpus) if is_cosine(exact) else corpus
+
+
+def query_vectors(corpus: np.ndarray, cosine: bool, count: int, noise: float, queries_path: str, rng) -> np.ndarray:
+    queries = []
+    if os.path.exists(queries_path):
+        texts = load_queries(queries_path)[:count]
+        queries.append(np.asarray(retriever.embeddings.embed_documents(texts), dtype=np.float32))
+    missing = count - sum(len(q) for q in queries)
+    if missing > 0:
+        rows = rng.choice(len(corpus), missing, replace=missing > len(corpus))
+        queries.append(corpus[rows] + rng.normal(0, noise * 5, (missing, corpus.shape[1])).astype(np.float32))
+    matrix = np.vstack(queries)
+    return normalize(matrix) if cosine else matrix
+
+
+def timed_search(index: faiss.Index, queries: np.ndarray, k: int):
+    """One query at a time, as the retriever mostly searches; returns hits and per-query latency (ms)."""
+    hits, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, indices = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits.append(indices[0])
+    return hits, latencies
+
+
+def recall_at_k(hits, truth) -> float:
+    recalls = []
+    for found, expected in zip(hits, truth):
+        expected = set(expected[expected != -1].tolist())
+        if expected:
+            recalls.append(len(expected & set(found.tolist())) / len(expected))
+    return float(np.mean(recalls)) if recalls else 0.0
+
+
+def sweep(index: faiss.Index, index_type: str, queries: np.ndarray, truth, k: int) -> dict:
+    if index_type == "flat":
+        knob, values = None, [None]
+    elif index_type == "hnsw":
+        knob, values = "efSearch", EF_SEARCH
+    else:
+        knob, values = "nprobe", [v for v in NPROBE if v <= faiss.extract_index_ivf(index).nlist]
+    points = []
+    for value in values:
+        point = {}
+        if knob:
+            set_search_params(index, **({"ef_search": value} if knob == "efSearch" else {"nprobe": value}))
+            point[knob] = value
+        hits, latencies = timed_search(index, queries, k)
+        point.update({"recall": recall_at_k(hits, truth), "latency_ms": summarize(latencies)})
+        points.append(point)
+        print(f"  {f'{knob}={value}' if knob else 'exhaustive':<12} recall@{k} {point['recall']:.4f}  "
+              f"p50 {point['latency_ms']['p50']:.3f}ms  p95 {point['latency_ms']['p95']:.3f}ms")
+    return {"knob": knob, "points": points}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--types", nargs="+", default=["hnsw", "ivf_flat", "ivf_pq"], choices=list(INDEX_TYPES))
+    parser.add_argument("--compression", nargs="+", default=["none"], choices=list(COMPRESSIONS))
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--k", type=int, default=16)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--queries", default=os.path.join(settings.DATA_DIR, "eval_queries.jsonl"))
+    parser.add_argument("--noise", type=float, default=0.01, help="Std-dev of the noise added to synthetic vectors")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--output", default=None, help="Result JSON path (default benchmarks/results/)")
+    args = parser.parse_args()
+
+    retriever.load_index()
+    snapshot = retriever.snapshot
+    if snapshot is None:
+        print("No index found. Run ingestion first.")
+        sys.exit(1)
+    rng = np.random.default_rng(0)
+    base = snapshot.index
+    corpus = corpus_vectors(base, args.scale, args.noise, rng)
+    queries = query_vectors(corpus, is_cosine(base), args.num_queries, args.noise, args.queries, rng)
+
+    exact = faiss.IndexFlat(corpus.shape[1], base.metric_type)
+    exact.add(corpus)
+    truth, latencies = timed_search(exact, queries, args.k)
+    print(f"{exact.ntotal} vectors, {len(queries)} queries, "
+          f"{'cosine' if is_cosine(base) else 'L2'}; exact p50 {summarize(latencies)['p50']:.3f}ms")
+    results = {
+        "vectors": exact.ntotal,
+        "queries": len(queries),
+        "k": args.k,
+        "exact": {"latency_ms": summarize(latencies), "bytes": len(faiss.serialize_index(exact))},
+        "types": {},
+    }
+
+    for index_type in args.types:
+        for compression in args.compression:
+            name = index_type if compression == "none" else f"{index_type}-{compression}"
+            try:
+                description = factory_string(index_type, exact.ntotal, exact.d, compression)
+            except ValueError as e:
+                print(f"{name}: {e}")
+                continue
+            with Timer() as build:
+                index = build_ann_index(exact, index_type, min_vectors=0, compression=compression)
+            if index is None:
+                print(f"{name}: nothing to build (exact flat, or too few vectors), skipped")
+                continue
+            size = len(faiss.serialize_index(index))
+            print(f"{name} ({description}, built in {build.seconds:.1f}s, "
+                  f"{size / 2**20:.1f} MiB, {results['exact']['bytes'] / size:.1f}x smaller than exact):")
+            result = sweep(index, index_type, queries, truth, args.k)
+            result.update({"factory": description, "build_seconds": build.seconds, "bytes": size})
+            good = [p for p in result["points"] if p["recall"] >= args.target_recall]
+            if good and result["knob"]:
+                best = good[0]
+                setting = "HNSW_EF_SEARCH" if index_type == "hnsw" else "IVF_NPROBE"
+                result["suggested"] = {setting: best[result["knob"]]}
+                print(f"  -> {setting}={best[result['knob']]} reaches recall {best['recall']:.4f} "
+                      f"at p50 {best['latency_ms']['p50']:.3f}ms")
+            elif not good:
+                print(f"  -> recall {args.target_recall} not reached; raise HNSW_M / IVF_NLIST or use less compression")
+            results["types"][name] = result
+
+    write_results("ann", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
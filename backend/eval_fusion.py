@@ -0,0 +1,98 @@
+"""
+Offline evaluation of hybrid fusion strategies.
+Reports recall@k and search latency per strategy against a labeled query set.
+
+Usage: python eval_fusion.py [--queries ../data/eval_queries.jsonl] [--k 1 3 5 8]
+
+Each line of the query set is JSON with a "query" plus "relevant_urls" and/or
+"relevant_chunk_ids". A hit is a retrieved chunk whose url or chunk_id is listed.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.config import settings
+from app.core.fusion import FUSION_STRATEGIES
+from app.core.retrieval import retriever
+
+
+def load_queries(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def recall(docs, labeled):
+    relevant = set(labeled.get("relevant_urls", [])) | set(labeled.get("relevant_chunk_ids", []))
+    if not relevant:
+        return None
+    found = set()
+    for doc in docs:
+        for key in ("url", "chunk_id"):
+            if doc.metadata.get(key) in relevant:
+                found.add(doc.metadata[key])
+    return len(found) / len(relevant)
+
+
+def evaluate(queries, strategy, ks, alpha):
+    recalls = {k: [] for k in ks}
+    latencies = []
+    for labeled in queries:
+        start = time.perf_counter()
+        docs = retriever.search(labeled["query"], top_k=max(ks), alpha=alpha, fusion=strategy)
+        latencies.append((time.perf_counter() - start) * 1000)
+        for k in ks:
+            r = recall(docs[:k], labeled)
+            if r is not None:
+                recalls[k].append(r)
+    return {
+        "recall": {f"@{k}": float(np.mean(v)) if v else 0.0 for k, v in recalls.items()},
+        "latency_ms": {
+            "mean": float(np.mean(latencies)),
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate hybrid fusion strategies")
+    parser.add_argument("--queries", default=os.path.join(settings.DATA_DIR, "eval_queries.jsonl"))
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 8])
+    parser.add_argument("--strategies", nargs="+", default=list(FUSION_STRATEGIES), choices=FUSION_STRATEGIES)
+    parser.add_argument("--alpha", type=float, default=settings.HYBRID_ALPHA)
+    parser.add_argument("--output", help="Optional path to write the results as JSON")
+    args = parser.parse_args()
+
+    if not retriever.snapshot:
+        print("❌ No index found. Run ingestion first.")
+        sys.exit(1)
+
+    queries = load_queries(args.queries)
+    # Queries run one at a time here; the micro-batch window would only add latency
+    retriever.batcher = None
+    # Warm up the embedding model so the first strategy is not charged for it
+    retriever.search(queries[0]["query"], top_k=1)
+
+    results = {}
+    for strategy in args.strategies:
+        results[strategy] = evaluate(queries, strategy, args.k, args.alpha)
+
+    print(f"{len(queries)} queries, alpha={args.alpha}")
+    header = "strategy  " + "".join(f"{'R@' + str(k):>8}" for k in args.k) + f"{'mean ms':>10}{'p95 ms':>10}"
+    print(header)
+    for strategy, r in results.items():
+        row = f"{strategy:<10}" + "".join(f"{r['recall'][f'@{k}']:>8.3f}" for k in args.k)
+        row += f"{r['latency_ms']['mean']:>10.2f}{r['latency_ms']['p95']:>10.2f}"
+        print(row)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"alpha": args.alpha, "num_queries": len(queries), "results": results}, f, indent=2)
+        print(f"📄 Results saved to: {args.output}")
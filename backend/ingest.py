@@ -9,12 +9,16 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app.core.ingestion import ingestion_manager
+from app.core.jobs import ingestion_lock
 
 if __name__ == "__main__":
     print("Starting ingestion...")
     try:
-        count = ingestion_manager.run_ingestion()
-        print(f"✅ Ingestion complete! Created {count} chunks")
+        # One at a time with ingestion jobs of the API workers
+        with ingestion_lock():
+            count = ingestion_manager.run_ingestion()
+        stats = ingestion_manager.last_run
+        print(f"✅ Ingestion complete! {count} chunks indexed ({stats['added']} added, {stats['removed']} removed, {stats['unchanged']} unchanged)")
         print(f"📂 Index saved to: {ingestion_manager.index_path}")
         print(f"📄 Metadata saved to: {ingestion_manager.metadata_path}")
     except Exception as e:
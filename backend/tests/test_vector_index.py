@@ -0,0 +1,72 @@
+import faiss
+import numpy as np
+import pytest
+from langchain_community.vectorstores.utils import DistanceStrategy
+
+from app.core.config import settings
+from app.core.vector_index import (
+    COMPRESSIONS, INDEX_TYPES, build_ann_index, io_flags, load_ann_index, load_vector_store, normalize, save_ann_index,
+)
+
+COMBINATIONS = [
+    (index_type, compression)
+    for index_type in INDEX_TYPES
+    for compression in COMPRESSIONS
+    if not (index_type == "flat" and compression == "none") and not (index_type == "hnsw" and compression == "pq")
+]
+
+
+@pytest.fixture
+def flat_index():
+    vectors = normalize(np.random.default_rng(0).random((300, 8), dtype=np.float32))
+    index = faiss.IndexFlatIP(8)
+    index.add(vectors)
+    return index
+
+
+@pytest.mark.parametrize("index_type,compression", COMBINATIONS)
+def test_ann_index_loads_memory_mapped(tmp_path, monkeypatch, flat_index, index_type, compression):
+    monkeypatch.setattr(settings, "VECTOR_INDEX_TYPE", index_type)
+    monkeypatch.setattr(settings, "VECTOR_COMPRESSION", compression)
+    monkeypatch.setattr(settings, "ANN_MIN_VECTORS", 0)
+    save_ann_index(build_ann_index(flat_index), str(tmp_path))
+
+    index = load_ann_index(str(tmp_path), flat_index, mmap=True)
+
+    assert index is not None and index.ntotal == flat_index.ntotal
+    _, ids = index.search(flat_index.reconstruct_n(0, 5), 1)
+    assert (ids >= 0).all()
+
+
+def test_flat_index_loads_memory_mapped(tmp_path, flat_index):
+    path = str(tmp_path / "index.faiss")
+    faiss.write_index(flat_index, path)
+
+    index = faiss.read_index(path, io_flags(True))
+
+    assert index.ntotal == flat_index.ntotal
+
+
+def test_unreadable_ann_index_falls_back_to_exact(tmp_path, monkeypatch, flat_index):
+    monkeypatch.setattr(settings, "VECTOR_INDEX_TYPE", "ivf_flat")
+    monkeypatch.setattr(settings, "ANN_MIN_VECTORS", 0)
+    (tmp_path / "ann").mkdir()
+    (tmp_path / "ann" / "ivf_flat.faiss").write_bytes(b"not an index")
+
+    assert load_ann_index(str(tmp_path), flat_index, mmap=True) is None
+
+
+def test_vector_store_loads_memory_mapped(tmp_path, flat_index):
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+
+    ids = {i: f"chunk_{i}" for i in range(flat_index.ntotal)}
+    docstore = InMemoryDocstore({chunk_id: Document(page_content=chunk_id) for chunk_id in ids.values()})
+    FAISS(None, flat_index, docstore, ids).save_local(str(tmp_path))
+
+    vector_store = load_vector_store(str(tmp_path), None, mmap=True)
+
+    assert vector_store.index.ntotal == flat_index.ntotal
+    assert vector_store.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT
+    assert vector_store.docstore.search(vector_store.index_to_docstore_id[3]).page_content == "chunk_3"
@@ -69,7 +69,7 @@ if [[ "$response" =~ ^([yY][eE][sS]|[yY])$ ]]; then
         -H "x-api-key: $ADMIN_API_KEY" \
         -H "Content-Type: application/json"
     echo ""
-    echo "✅ Ingestion complete!"
+    echo "✅ Ingestion started! Check progress with: curl -H \"x-api-key: \$ADMIN_API_KEY\" http://localhost:8000/api/ingest/<job_id>"
 fi
 
 echo ""